@@ -1,8 +1,128 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import UserProfile, MangoCategory, Cart, CartItem, Order, OrderItem, Payment, CategoryFeedback
+from django.contrib.admin.forms import AdminAuthenticationForm
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.contrib.auth.forms import UserChangeForm
+from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils.functional import cached_property
+from .models import UserProfile, MangoCategory, Cart, CartItem, Order, OrderItem, Payment, CategoryFeedback, ArchivedOrder, ArchivedOrderItem
+from .analytics import locked_status, record_status_change
+from .auth_backends import email_taken
+from .password_pool import PasswordHashingBusy
+from .search import PHONE_QUERY, order_search_filter, phone_query_forms, user_search_filter
+from .bulk_import import BulkImportError, apply_import, parse_rows
 
 # Register your models here.
 
+# Exact COUNT(*) over millions of rows is slow on PostgreSQL. For unfiltered
+# changelists of large tables use the planner's row estimate instead; filtered
+# lists (which hit indexes) still get an exact count.
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            connection = connections[self.object_list.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                                   [self.object_list.model._meta.db_table])
+                    row = cursor.fetchone()
+                threshold = getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 100000)
+                if row and row[0] >= threshold:
+                    return int(row[0])
+        return super().count
+
+# Changelist defaults for tables that grow with traffic
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+# Order search box backed by the indexed phone / address search in api/search.py
+# instead of LIKE scans over search_fields (which only switch the box on)
+class OrderSearchMixin:
+    search_fields = ['phone_digits', 'additional_phone_digits', 'shipping_address']
+    search_help_text = 'Phone number, part of the shipping address, customer email or #order id'
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        condition = order_search_filter(search_term)
+        return (queryset.filter(condition) if condition is not None else queryset.none()), False
+
+# Search box for tables found by their user: exact username or email only,
+# both answered from auth_user's indexes (icontains would scan every row)
+class UserSearchMixin:
+    user_path = 'user'
+    search_help_text = 'Exact username or email address'
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(self.search_filter(search_term.strip())), False
+
+    def search_filter(self, search_term):
+        return user_search_filter(search_term, self.user_path)
+
+# Status / payment method filters with a fixed list of values. The fields have
+# no choices, so plain list_filter entries would run SELECT DISTINCT over the
+# whole table on every changelist load. Values are stored either as the
+# frontend's slug or as the label ('delivered' / 'Delivered'); both match.
+class FixedValuesFilter(admin.SimpleListFilter):
+    values = []
+
+    def lookups(self, request, model_admin):
+        return self.values
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        label = dict(self.values).get(self.value(), self.value())
+        # An OR of equalities rather than IN: partial indexes on these values
+        # (payment_pending_idx) can then serve the filter with bound parameters
+        return queryset.filter(Q(**{self.parameter_name: self.value()}) | Q(**{self.parameter_name: label}))
+
+class OrderStatusFilter(FixedValuesFilter):
+    title = 'status'
+    parameter_name = 'status'
+    values = [
+        ('pending', 'Pending'),
+        ('confirmed', 'Confirmed'),
+        ('in_transit', 'In Transit'),
+        ('out_for_delivery', 'Out for Delivery'),
+        ('delivered', 'Delivered'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+class PaymentMethodFilter(FixedValuesFilter):
+    title = 'payment method'
+    parameter_name = 'payment_method'
+    values = [
+        ('cash_on_delivery', 'Cash on Delivery'),
+        ('mobile_banking', 'Mobile Banking'),
+        ('bank_transfer', 'Bank Transfer'),
+        ('card', 'Card Payment'),
+        ('bkash', 'bKash'),
+        ('nagad', 'Nagad'),
+        ('rocket', 'Rocket'),
+    ]
+
+class PaymentStatusFilter(FixedValuesFilter):
+    title = 'payment status'
+    parameter_name = 'payment_status'
+    values = [
+        ('pending', 'Pending'),
+        ('paid', 'Paid'),
+        ('failed', 'Failed'),
+        ('refunded', 'Refunded'),
+    ]
+
 class CategoryFeedbackInline(admin.TabularInline):
     model = CategoryFeedback
     extra = 0
@@ -15,24 +135,165 @@ class OrderItemInline(admin.TabularInline):
     readonly_fields = ['mango', 'quantity', 'price']
     can_delete = False
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('mango')
+
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'total_amount', 'status', 'order_date']
-    list_filter = ['status', 'order_date', 'payment_method']
-    search_fields = ['user__username', 'user__email', 'id']
-    readonly_fields = ['order_date']
+class OrderAdmin(OrderSearchMixin, LargeTableAdmin):
+    list_display = ['id', 'user', 'items_preview', 'total_kg', 'total_amount', 'status', 'order_date']
+    list_filter = [OrderStatusFilter, 'order_date', PaymentMethodFilter]
+    list_select_related = ['user']
+    readonly_fields = ['order_date', 'item_count', 'total_kg', 'items_preview']
+    raw_id_fields = ['user']
+    date_hierarchy = 'order_date'
+    # Newest first, like the order endpoints: served by order_date_idx and,
+    # when filtered, order_status_date_idx (the default -pk would walk the whole table)
+    ordering = ['-order_date']
     inlines = [OrderItemInline]
 
+    def save_model(self, request, obj, form, change):
+        # The change form runs in a transaction; lock the row so a concurrent
+        # status change can't read the same previous status
+        previous_status = locked_status(obj.pk) if change else None
+        super().save_model(request, obj, form, change)
+        if change and previous_status != obj.status:
+            record_status_change(obj, previous_status)
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    extra = 0
+    readonly_fields = ['mango', 'quantity', 'price']
+    can_delete = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('mango')
+
+# Archived orders are read-only; `manage.py archive_orders` fills the table
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(OrderSearchMixin, LargeTableAdmin):
+    list_display = ['id', 'user', 'items_preview', 'total_kg', 'total_amount', 'status', 'order_date', 'archived_at']
+    list_filter = [OrderStatusFilter, PaymentMethodFilter]
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    date_hierarchy = 'order_date'
+    ordering = ['-order_date']
+    inlines = [ArchivedOrderItemInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(MangoCategory)
+class MangoCategoryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'price', 'stock_quantity']
+    list_editable = ['price', 'stock_quantity']
+    search_fields = ['name']
+    ordering = ['name']
+
+    def get_urls(self):
+        urls = [
+            path('import/', self.admin_site.admin_view(self.import_view), name='api_mangocategory_import'),
+        ]
+        return urls + super().get_urls()
+
+    # Bulk stock / price import from an uploaded CSV or JSON file
+    def import_view(self, request):
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        context = {**self.admin_site.each_context(request), 'opts': self.model._meta, 'title': 'Import stock & prices'}
+        if request.method == 'POST' and request.FILES.get('file'):
+            upload = request.FILES['file']
+            try:
+                rows = parse_rows(upload.read(), filename=upload.name)
+                context['result'] = apply_import(rows, dry_run=bool(request.POST.get('dry_run')))
+            except BulkImportError as e:
+                context['errors'] = e.errors
+        return TemplateResponse(request, 'admin/api/mangocategory/import_stock.html', context)
+
 @admin.register(CategoryFeedback)
-class CategoryFeedbackAdmin(admin.ModelAdmin):
+class CategoryFeedbackAdmin(LargeTableAdmin):
     list_display = ['id', 'user', 'mango_category', 'rating', 'created_at', 'updated_at']
     list_filter = ['rating', 'created_at', 'mango_category']
-    search_fields = ['user__username', 'mango_category__name', 'comment']
+    list_select_related = ['user', 'mango_category']
+    # No 'comment': free-text icontains would scan the whole table
+    search_fields = ['user__username', 'mango_category__name']
     readonly_fields = ['created_at', 'updated_at']
+    raw_id_fields = ['user', 'order_item', 'archived_order_item']
+    autocomplete_fields = ['mango_category']
+    date_hierarchy = 'created_at'
+
+@admin.register(OrderItem)
+class OrderItemAdmin(LargeTableAdmin):
+    list_display = ['id', 'order', 'mango', 'quantity', 'price']
+    list_select_related = ['order__user', 'mango']
+    search_fields = ['=order__id', 'mango__name']
+    raw_id_fields = ['order']
+    autocomplete_fields = ['mango']
+
+@admin.register(Payment)
+class PaymentAdmin(LargeTableAdmin):
+    list_display = ['id', 'order', 'payment_method', 'payment_status', 'payment_date']
+    list_filter = [PaymentStatusFilter]
+    list_select_related = ['order__user']
+    search_fields = ['=order__id']
+    raw_id_fields = ['order']
+
+@admin.register(Cart)
+class CartAdmin(UserSearchMixin, LargeTableAdmin):
+    list_display = ['id', 'user', 'created_at', 'last_activity']
+    list_select_related = ['user']
+    search_fields = ['=user__username', '=user__email']
+    raw_id_fields = ['user']
+    date_hierarchy = 'last_activity'
+
+@admin.register(CartItem)
+class CartItemAdmin(UserSearchMixin, LargeTableAdmin):
+    list_display = ['id', 'cart', 'mango', 'quantity']
+    list_filter = ['mango']
+    list_select_related = ['cart', 'mango']
+    user_path = 'cart__user'
+    search_fields = ['=cart__user__username', '=cart__user__email']
+    raw_id_fields = ['cart']
+    autocomplete_fields = ['mango']
+
+# Emails are unique regardless of case (auth_user_email_upper_uniq); report a
+# duplicate on the form instead of failing on the index
+class UniqueEmailUserChangeForm(UserChangeForm):
+    def clean_email(self):
+        email = User.objects.normalize_email(self.cleaned_data.get('email'))
+        if email and email_taken(email, exclude_user=self.instance):
+            raise ValidationError('A user with that email address already exists.')
+        return email
+
+# The password check runs in api.password_pool, which may be saturated; the
+# API answers 503, the admin sign-in page shows an error instead of a 500
+class AdminLoginForm(AdminAuthenticationForm):
+    def clean(self):
+        try:
+            return super().clean()
+        except PasswordHashingBusy:
+            raise ValidationError('The server is busy, please try again in a moment.', code='busy')
+
+admin.site.login_form = AdminLoginForm
+
+admin.site.unregister(User)
+
+@admin.register(User)
+class UserAdmin(BaseUserAdmin):
+    form = UniqueEmailUserChangeForm
+
+@admin.register(UserProfile)
+class UserProfileAdmin(UserSearchMixin, LargeTableAdmin):
+    list_display = ['id', 'user', 'phone_number']
+    list_select_related = ['user']
+    search_fields = ['=user__username', '=user__email', 'phone_digits']
+    search_help_text = 'Exact username, email address or phone number (any format)'
 
-admin.site.register(UserProfile)
-admin.site.register(MangoCategory)
-admin.site.register(Cart)
-admin.site.register(CartItem)
-admin.site.register(OrderItem)
-admin.site.register(Payment)
+    def search_filter(self, search_term):
+        # Phone numbers are matched on the normalised, indexed phone_digits
+        if PHONE_QUERY.fullmatch(search_term):
+            return Q(phone_digits__in=phone_query_forms(search_term))
+        return super().search_filter(search_term)
+    raw_id_fields = ['user']
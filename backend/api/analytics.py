@@ -0,0 +1,199 @@
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem, DailySalesRollup, MangoSalesRollup, CustomerSalesRollup
+
+logger = logging.getLogger('api.analytics')
+
+# Orders in these statuses are not counted as sales.
+EXCLUDED_STATUSES = {'cancelled'}
+
+
+def counts_as_sale(status):
+    return (status or '').lower() not in EXCLUDED_STATUSES
+
+
+def _bump(model, lookup, order_count, kg_sold, revenue):
+    # Create the row if needed, then apply the delta in SQL so concurrent
+    # orders on the same day never overwrite each other.
+    model.objects.get_or_create(**lookup)
+    model.objects.filter(**lookup).update(
+        order_count=F('order_count') + order_count,
+        kg_sold=F('kg_sold') + kg_sold,
+        revenue=F('revenue') + revenue,
+    )
+
+
+def _apply_order(order, sign):
+    day = timezone.localdate(order.order_date)
+    per_mango = defaultdict(lambda: [0, Decimal('0')])
+    for mango_id, quantity, price in OrderItem.objects.filter(order=order).values_list('mango_id', 'quantity', 'price'):
+        per_mango[mango_id][0] += quantity
+        per_mango[mango_id][1] += quantity * price
+    kg_sold = sum(kg for kg, _ in per_mango.values())
+    user_id, total = order.user_id, order.total_amount
+
+    def apply():
+        # The order itself is already committed; a failed rollup must not fail the request
+        try:
+            with transaction.atomic():
+                _bump(DailySalesRollup, {'date': day}, sign, sign * kg_sold, sign * total)
+                _bump(CustomerSalesRollup, {'date': day, 'user_id': user_id}, sign, sign * kg_sold, sign * total)
+                for mango_id, (kg, revenue) in per_mango.items():
+                    _bump(MangoSalesRollup, {'date': day, 'mango_id': mango_id}, sign, sign * kg, sign * revenue)
+        except Exception:
+            logger.exception('Could not update sales rollups for order %s; run backfill_sales_rollups '
+                             'for %s to repair them', order.pk, day)
+
+    # The day's rollup row is shared by every order, so it is only locked
+    # after the caller's transaction commits (right away outside of one)
+    transaction.on_commit(apply)
+
+
+# Call after an order and all of its items have been saved
+def record_order(order):
+    if counts_as_sale(order.status):
+        _apply_order(order, 1)
+
+
+_keep_rollups = ContextVar('keep_rollups', default=False)
+
+
+@contextmanager
+def rollups_unchanged():
+    """Delete orders without taking them out of the rollups (used when archiving)."""
+    token = _keep_rollups.set(True)
+    try:
+        yield
+    finally:
+        _keep_rollups.reset(token)
+
+
+# Call before an order is deleted (its items are still there); see api/signals.py
+def record_order_deleted(order):
+    if not _keep_rollups.get() and counts_as_sale(order.status):
+        _apply_order(order, -1)
+
+
+# Call after an order's status has been saved. previous_status must have been
+# read with select_for_update() in the saving transaction (see locked_status),
+# or two concurrent status changes could both apply the same delta.
+def record_status_change(order, previous_status):
+    was_sale = counts_as_sale(previous_status)
+    is_sale = counts_as_sale(order.status)
+    if was_sale and not is_sale:
+        _apply_order(order, -1)
+    elif is_sale and not was_sale:
+        _apply_order(order, 1)
+
+
+def locked_status(order_id):
+    """Current status of an order, locking its row until the transaction ends."""
+    return Order.objects.select_for_update().values_list('status', flat=True).get(pk=order_id)
+
+
+def rebuild_rollups(start=None, end=None):
+    """Recompute rollups from live and archived orders for the given date range (inclusive)."""
+    daily = {}
+    customers = {}
+    mangoes = {}
+    for order_model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+        orders = order_model.objects.all()
+        for status in EXCLUDED_STATUSES:
+            orders = orders.exclude(status__iexact=status)
+        items = item_model.objects.filter(order__in=orders)
+        if start:
+            orders = orders.filter(order_date__date__gte=start)
+            items = items.filter(order__order_date__date__gte=start)
+        if end:
+            orders = orders.filter(order_date__date__lte=end)
+            items = items.filter(order__order_date__date__lte=end)
+
+        kg_per_order = dict(items.values('order_id').annotate(kg=Sum('quantity')).values_list('order_id', 'kg'))
+        for order_id, user_id, day, total in orders.annotate(day=TruncDate('order_date')).values_list('id', 'user_id', 'day', 'total_amount'):
+            kg = kg_per_order.get(order_id, 0)
+            for key, bucket in (((day,), daily), ((day, user_id), customers)):
+                row = bucket.setdefault(key, [0, 0, Decimal('0')])
+                row[0] += 1
+                row[1] += kg
+                row[2] += total
+
+        per_mango = (
+            items.annotate(day=TruncDate('order__order_date'))
+            .values('day', 'mango_id')
+            .annotate(
+                order_count=Count('order_id', distinct=True),
+                kg_sold=Sum('quantity'),
+                revenue=Sum(F('quantity') * F('price')),
+            )
+        )
+        # An order is either live or archived, so the two tables' counts add up
+        for row in per_mango:
+            totals = mangoes.setdefault((row['day'], row['mango_id']), [0, 0, Decimal('0')])
+            totals[0] += row['order_count']
+            totals[1] += row['kg_sold']
+            totals[2] += row['revenue']
+
+    with transaction.atomic():
+        for model in (DailySalesRollup, MangoSalesRollup, CustomerSalesRollup):
+            stale = model.objects.all()
+            if start:
+                stale = stale.filter(date__gte=start)
+            if end:
+                stale = stale.filter(date__lte=end)
+            stale.delete()
+
+        DailySalesRollup.objects.bulk_create([
+            DailySalesRollup(date=day, order_count=count, kg_sold=kg, revenue=revenue)
+            for (day,), (count, kg, revenue) in daily.items()
+        ], batch_size=1000)
+        CustomerSalesRollup.objects.bulk_create([
+            CustomerSalesRollup(date=day, user_id=user_id, order_count=count, kg_sold=kg, revenue=revenue)
+            for (day, user_id), (count, kg, revenue) in customers.items()
+        ], batch_size=1000)
+        MangoSalesRollup.objects.bulk_create([
+            MangoSalesRollup(date=day, mango_id=mango_id, order_count=count, kg_sold=kg, revenue=revenue)
+            for (day, mango_id), (count, kg, revenue) in mangoes.items()
+        ], batch_size=1000)
+
+    return len(daily)
+
+
+def sales_summary(start, end, top=10):
+    """Answer an analytics query for [start, end] from the rollup tables only."""
+    days = DailySalesRollup.objects.filter(date__range=(start, end)).order_by('date')
+    totals = days.aggregate(order_count=Sum('order_count'), kg_sold=Sum('kg_sold'), revenue=Sum('revenue'))
+
+    per_mango = (
+        MangoSalesRollup.objects.filter(date__range=(start, end))
+        .values('mango_id', mango_name=F('mango__name'))
+        .annotate(order_count=Sum('order_count'), kg_sold=Sum('kg_sold'), revenue=Sum('revenue'))
+        .order_by('-kg_sold')
+    )
+    top_customers = (
+        CustomerSalesRollup.objects.filter(date__range=(start, end))
+        .values('user_id', username=F('user__username'))
+        .annotate(order_count=Sum('order_count'), kg_sold=Sum('kg_sold'), revenue=Sum('revenue'))
+        .order_by('-revenue')[:top]
+    )
+
+    return {
+        'start': start,
+        'end': end,
+        'totals': {
+            'order_count': totals['order_count'] or 0,
+            'kg_sold': totals['kg_sold'] or 0,
+            'revenue': totals['revenue'] or Decimal('0'),
+        },
+        'daily': list(days.values('date', 'order_count', 'kg_sold', 'revenue')),
+        'per_mango': list(per_mango),
+        'top_customers': list(top_customers),
+    }
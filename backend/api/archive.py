@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .analytics import rollups_unchanged
+from .models import Order, OrderItem, Payment, CategoryFeedback, ArchivedOrder, ArchivedOrderItem, ArchivedPayment
+
+# Order archival.
+# Finished orders (ORDER_ARCHIVE_STATUSES) older than ORDER_ARCHIVE_AFTER_DAYS
+# are moved to the Archived* tables in batches, each batch in one transaction:
+# copy orders, items and payments, move feedback over to the archived items,
+# then delete the live rows. Sales rollups are untouched, and feedback keeps
+# counting towards mango ratings.
+
+
+def cutoff(days=None):
+    if days is None:
+        days = settings.ORDER_ARCHIVE_AFTER_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable_orders(before):
+    finished = Q()
+    for status in settings.ORDER_ARCHIVE_STATUSES:
+        finished |= Q(status__iexact=status)
+    return Order.objects.filter(finished, order_date__lt=before)
+
+
+def _copy(instance, model):
+    return model(**{field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields})
+
+
+def archive_batch(before, batch_size):
+    """Archive up to batch_size of the oldest archivable orders. Returns how many were moved."""
+    with transaction.atomic():
+        # Orders locked by a concurrent update are left for the next run
+        orders = list(
+            archivable_orders(before).order_by('order_date', 'id')
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        if not orders:
+            return 0
+        order_ids = [order.id for order in orders]
+
+        ArchivedOrder.objects.bulk_create([_copy(order, ArchivedOrder) for order in orders])
+        ArchivedOrderItem.objects.bulk_create(
+            [_copy(item, ArchivedOrderItem) for item in OrderItem.objects.filter(order_id__in=order_ids)],
+            batch_size=1000,
+        )
+        ArchivedPayment.objects.bulk_create(
+            [_copy(payment, ArchivedPayment) for payment in Payment.objects.filter(order_id__in=order_ids)],
+            batch_size=1000,
+        )
+        # Archived items keep their ids, so the feedback just switches columns
+        CategoryFeedback.objects.filter(order_item__order_id__in=order_ids).update(
+            archived_order_item=F('order_item'), order_item=None,
+        )
+        with rollups_unchanged():
+            Order.objects.filter(id__in=order_ids).delete()
+    return len(order_ids)
+
@@ -0,0 +1,101 @@
+from django.db.models import Avg, Count
+from django.http import JsonResponse
+from django.views.decorators.http import require_safe
+from rest_framework.authtoken.models import Token
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import ArchivedOrder, CategoryFeedback, MangoCategory, Order
+from .response_cache import cached_payload
+from .serializers import field_options, wants
+from .serializers import CategoryFeedbackSerializer, MangoCategorySerializer, OrderWithItemsSerializer
+from .views import include_archived, merge_orders, optimize_orders
+
+# Async versions of the read-heavy endpoints, for deployments under ASGI
+# (see core/asgi.py). Rows are fetched with the async ORM and everything a
+# serializer touches is joined or prefetched up front, so serialising never
+# falls back to a lazy (synchronous) query. Responses match the sync views,
+# and the catalog and reviews share their payload cache groups.
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+async def authenticated_user(request):
+    # Same schemes as REST_FRAMEWORK's DEFAULT_AUTHENTICATION_CLASSES: token first, then session
+    keyword, _, key = request.headers.get('Authorization', '').partition(' ')
+    if keyword == 'Token' and key:
+        token = await Token.objects.select_related('user').filter(key=key.strip()).afirst()
+        return token.user if token is not None and token.user.is_active else None
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+def catalog_queryset(options):
+    queryset = MangoCategory.objects.all()
+    if wants(options, 'average_rating') or wants(options, 'total_ratings'):
+        queryset = queryset.annotate(rating_average=Avg('feedbacks__rating'), rating_count=Count('feedbacks'))
+    return queryset
+
+
+# Mango catalog list
+@require_safe
+@cached_payload('catalog')
+async def list_mangoes(request):
+    options = field_options(request)
+    mangoes = [mango async for mango in catalog_queryset(options).order_by('id')]
+    serializer = MangoCategorySerializer(mangoes, many=True, context={'request': request}, **options)
+    return json_response(serializer.data)
+
+
+# Mango catalog detail
+@require_safe
+@cached_payload('catalog')
+async def get_mango(request, mango_id):
+    options = field_options(request)
+    mango = await catalog_queryset(options).filter(id=mango_id).afirst()
+    if mango is None:
+        return json_response({'detail': 'No MangoCategory matches the given query.'}, status=404)
+    serializer = MangoCategorySerializer(mango, context={'request': request}, **options)
+    return json_response(serializer.data)
+
+
+# Review feed for a mango category
+@require_safe
+@cached_payload('feedback')
+async def get_mango_category_feedbacks(request, mango_id):
+    if not await MangoCategory.objects.filter(id=mango_id).aexists():
+        return json_response({'error': 'Mango category not found'}, status=404)
+
+    options = field_options(request)
+    feedbacks = CategoryFeedback.objects.filter(mango_category_id=mango_id).order_by('-created_at')
+    if wants(options, 'user_name'):
+        feedbacks = feedbacks.select_related('user')
+    if wants(options, 'mango_name'):
+        feedbacks = feedbacks.select_related('mango_category')
+    feedbacks = [feedback async for feedback in feedbacks]
+    serializer = CategoryFeedbackSerializer(feedbacks, many=True, **options)
+
+    ratings = [f.rating for f in feedbacks]
+    return json_response({
+        'feedbacks': serializer.data,
+        'average_rating': round(sum(ratings) / len(ratings), 1) if ratings else 0,
+        'total_ratings': len(ratings),
+    })
+
+
+# Order history with items for the logged-in user
+@require_safe
+async def get_user_orders_with_items(request):
+    user = await authenticated_user(request)
+    if user is None:
+        return json_response({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    options = field_options(request)
+    orders = optimize_orders(Order.objects.filter(user=user).order_by('-order_date'), options)
+    orders = [order async for order in orders]
+    if include_archived(request):
+        archived = optimize_orders(ArchivedOrder.objects.filter(user=user), options)
+        orders = merge_orders(orders, [order async for order in archived])
+    serializer = OrderWithItemsSerializer(orders, many=True, **options)
+    return json_response(serializer.data)
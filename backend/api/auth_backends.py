@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Q
+from django.db.models.functions import Upper
+
+from .password_pool import check_user_password, hash_password
+
+UserModel = get_user_model()
+
+
+def email_taken(email, exclude_user=None):
+    """Whether another account already uses this email, case-insensitively (the
+    auth_user_email_upper_uniq index). Pass the user being edited as exclude_user."""
+    users = UserModel.objects.annotate(email_upper=Upper('email')).filter(email_upper=email.upper())
+    if exclude_user is not None and exclude_user.pk is not None:
+        users = users.exclude(pk=exclude_user.pk)
+    return users.exists()
+
+
+class EmailOrUsernameBackend(ModelBackend):
+    """Log in with a username or a case-insensitive email address in one query.
+
+    Emails are compared as UPPER(email) so the auth_user_email_upper_idx
+    expression index is used. The user's API token is joined into the same
+    query so the login view does not have to fetch it.
+    """
+
+    def authenticate(self, request, username=None, password=None, email=None, **kwargs):
+        login = email or username or kwargs.get(UserModel.USERNAME_FIELD)
+        # Logins come straight from request bodies, which may hold any JSON type
+        if not login or not isinstance(login, str) or not isinstance(password, str):
+            return None
+
+        if email:
+            condition = Q(email_upper=login.upper())
+        else:
+            condition = Q(username=login) | Q(email_upper=login.upper())
+        candidates = list(
+            UserModel.objects.select_related('auth_token')
+            .annotate(email_upper=Upper('email'))
+            .filter(condition)[:2]
+        )
+        # A username match wins over another account whose email happens to equal it
+        user = next((u for u in candidates if u.username == login), candidates[0] if candidates else None)
+
+        if user is None:
+            # Run the hasher anyway so unknown logins take as long as wrong passwords
+            hash_password(password)
+            return None
+        # Hashing runs in api.password_pool's process pool and may raise PasswordHashingBusy
+        if check_user_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,153 @@
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .models import MangoCategory
+from .signals import catalog_updated
+
+# Bulk stock / price updates for MangoCategory from CSV or JSON.
+# Each row identifies a mango by `id` (or exact `name`) and may set `price`
+# and/or `stock_quantity`. The whole file is validated before anything is
+# written; if any row is invalid nothing is applied.
+
+IMPORT_FIELDS = ['price', 'stock_quantity']
+
+
+class BulkImportError(Exception):
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def parse_rows(content, fmt=None, filename=''):
+    if isinstance(content, bytes):
+        try:
+            content = content.decode('utf-8-sig')
+        except UnicodeDecodeError as e:
+            raise BulkImportError([f'File is not UTF-8 text (invalid byte at position {e.start})'])
+    fmt = (fmt or '').lower() or ('json' if filename.lower().endswith('.json') or content.lstrip()[:1] in '[{' else 'csv')
+
+    if fmt == 'json':
+        try:
+            data = json.loads(content)
+        except ValueError as e:
+            raise BulkImportError([f'Invalid JSON: {e}'])
+        if isinstance(data, dict):
+            data = data.get('rows', [])
+        if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+            raise BulkImportError(['JSON must be a list of objects (or {"rows": [...]})'])
+        return data
+
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(content))
+        return [{key.strip(): (value or '').strip() for key, value in row.items() if key} for row in reader]
+
+    raise BulkImportError([f'Unsupported format: {fmt}'])
+
+
+def _clean_value(field, value):
+    if field == 'price':
+        price = Decimal(str(value))
+        if not price.is_finite() or price < 0 or price != price.quantize(Decimal('0.01')):
+            raise ValueError
+        return price.quantize(Decimal('0.01'))
+    stock = int(str(value))
+    if stock < 0:
+        raise ValueError
+    return stock
+
+
+def _display(field, value):
+    # Prices are reported as decimal strings, like the API's DecimalField output
+    if field == 'price':
+        return str(Decimal(value).quantize(Decimal('0.01')))
+    return value
+
+
+def validate_rows(rows):
+    """Return {mango_id: {field: new_value}} or raise BulkImportError with every problem found."""
+    by_id = MangoCategory.objects.in_bulk()
+    by_name = {mango.name.lower(): mango for mango in by_id.values()}
+    errors = []
+    updates = {}
+
+    if not rows:
+        raise BulkImportError(['No rows to import'])
+
+    for line, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append(f'Row {line}: must be an object with id or name')
+            continue
+        mango = None
+        if str(row.get('id', '')).strip():
+            try:
+                mango = by_id.get(int(str(row['id']).strip()))
+            except ValueError:
+                pass
+        elif str(row.get('name', '')).strip():
+            mango = by_name.get(str(row['name']).strip().lower())
+        else:
+            errors.append(f'Row {line}: id or name is required')
+            continue
+        if mango is None:
+            errors.append(f'Row {line}: mango not found ({row.get("id") or row.get("name")})')
+            continue
+        if mango.id in updates:
+            errors.append(f'Row {line}: {mango.name} appears more than once')
+            continue
+
+        changes = {}
+        row_errors = len(errors)
+        for field in IMPORT_FIELDS:
+            value = row.get(field)
+            if value is None or str(value).strip() == '':
+                continue
+            try:
+                changes[field] = _clean_value(field, value)
+            except (ValueError, InvalidOperation):
+                errors.append(f'Row {line}: invalid {field} "{value}"')
+        if not changes and len(errors) == row_errors:
+            errors.append(f'Row {line}: nothing to update for {mango.name}')
+        updates[mango.id] = changes
+
+    if errors:
+        raise BulkImportError(errors)
+    return updates
+
+
+def apply_import(rows, dry_run=False):
+    """Validate and apply an import in one transaction. Returns a diff report."""
+    updates = validate_rows(rows)
+
+    with transaction.atomic():
+        mangoes = MangoCategory.objects.select_for_update().in_bulk(list(updates))
+        changed = []
+        diff = []
+        for mango_id, changes in updates.items():
+            mango = mangoes[mango_id]
+            row_diff = {}
+            for field, new_value in changes.items():
+                old_value = getattr(mango, field)
+                if old_value != new_value:
+                    row_diff[field] = {'old': _display(field, old_value), 'new': _display(field, new_value)}
+                    setattr(mango, field, new_value)
+            if row_diff:
+                changed.append(mango)
+                diff.append({'id': mango.id, 'name': mango.name, 'changes': row_diff})
+
+        if changed and not dry_run:
+            MangoCategory.objects.bulk_update(changed, IMPORT_FIELDS, batch_size=500)
+            # Notify dependent caches once for the whole import, after commit
+            changed_ids = [mango.id for mango in changed]
+            transaction.on_commit(lambda: catalog_updated.send(sender=MangoCategory, mango_ids=changed_ids))
+
+    return {
+        'dry_run': dry_run,
+        'rows': len(rows),
+        'updated': len(changed),
+        'unchanged': len(updates) - len(changed),
+        'diff': diff,
+    }
@@ -0,0 +1,71 @@
+import gzip
+import re
+import zlib
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Response compression helpers used by CompressionMiddleware and the payload
+# cache. Brotli is used when the `brotli` package is installed and the client
+# accepts it, gzip otherwise.
+
+DEFAULT_TYPES = ('application/json', 'text/', 'application/javascript', 'image/svg+xml')
+_ACCEPT_RE = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*')
+
+
+def supported_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encoding):
+    """Pick the best encoding the client accepts, or None."""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        match = _ACCEPT_RE.fullmatch(part)
+        if match:
+            try:
+                accepted[match.group(1).lower()] = float(match.group(2) or 1)
+            except ValueError:
+                continue
+    best = None
+    for encoding in supported_encodings():
+        quality = accepted.get(encoding, accepted.get('*', 0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+def compressible(content_type):
+    types = getattr(settings, 'COMPRESSION_TYPES', DEFAULT_TYPES)
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    return any(content_type.startswith(prefix) for prefix in types)
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+        # Flush so every chunk reaches the client without waiting for the next
+        yield compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
@@ -0,0 +1,48 @@
+from django.db import connections
+
+from .metrics import registry
+
+# Connection pool statistics for /api/metrics/ (see DB_POOL in core/settings.py).
+# psycopg_pool keeps running totals per pool; they are copied into the metrics
+# registry after each request and whenever metrics are scraped.
+
+# psycopg_pool stat -> (metric name, scale)
+POOL_STATS = {
+    'pool_max': ('db_pool_max_size', 1),
+    'pool_size': ('db_pool_size', 1),
+    'pool_available': ('db_pool_available', 1),
+    'requests_waiting': ('db_pool_requests_waiting', 1),
+    'requests_num': ('db_pool_requests_total', 1),
+    'requests_queued': ('db_pool_requests_queued_total', 1),
+    'requests_wait_ms': ('db_pool_requests_wait_seconds_total', 0.001),
+    'requests_errors': ('db_pool_requests_errors_total', 1),
+    'connections_lost': ('db_pool_connections_lost_total', 1),
+}
+
+
+def pool_for(alias):
+    connection = connections[alias]
+    # Only the PostgreSQL backend (Django 5.1+) has pools; `pool` creates it on first use
+    if not connection.settings_dict.get('OPTIONS', {}).get('pool'):
+        return None
+    return getattr(connection, 'pool', None)
+
+
+def pool_stats(alias='default'):
+    pool = pool_for(alias)
+    return pool.get_stats() if pool is not None else None
+
+
+def record_pool_metrics():
+    for alias in connections:
+        stats = pool_stats(alias)
+        if stats is None:
+            continue
+        labels = (('alias', alias),)
+        for key, (name, scale) in POOL_STATS.items():
+            registry.set(name, labels, stats.get(key, 0) * scale)
+
+
+def count_connect(sender, connection, **kwargs):
+    # connection_created receiver
+    registry.inc('db_connects_total', (('alias', connection.alias),))
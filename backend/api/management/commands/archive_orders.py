@@ -0,0 +1,67 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Min
+
+from api.archive import archivable_orders, archive_batch, cutoff
+
+logger = logging.getLogger('api.archive')
+
+
+class Command(BaseCommand):
+    help = ('Move finished orders older than ORDER_ARCHIVE_AFTER_DAYS, with their items, payments and '
+            'feedback, to the archive tables in small batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 365),
+                            help='Archive orders placed at least this many days ago.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Orders moved per transaction (keeps locks short).')
+        parser.add_argument('--max-batches', type=int, default=0,
+                            help='Stop after this many batches (0 = no limit).')
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='Seconds to pause between batches.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be archived.')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--days and --batch-size must be at least 1.')
+
+        before = cutoff(options['days'])
+        if options['dry_run']:
+            self.report(before)
+            return
+
+        started = time.monotonic()
+        archived = batches = 0
+        while not options['max_batches'] or batches < options['max_batches']:
+            count = archive_batch(before, options['batch_size'])
+            archived += count
+            if count:
+                batches += 1
+            if count < options['batch_size']:
+                break
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        elapsed = time.monotonic() - started
+        logger.info(
+            'order archival: orders_archived=%d batches=%d seconds=%.2f cutoff=%s',
+            archived, batches, elapsed, before.isoformat(),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} order(s) in {batches} batch(es) ({elapsed:.2f}s).'
+        ))
+
+    def report(self, before):
+        orders = archivable_orders(before)
+        totals = orders.aggregate(orders=Count('id'), oldest=Min('order_date'))
+        self.stdout.write(f'Finished orders placed before {before:%Y-%m-%d %H:%M}:')
+        self.stdout.write(f'  orders: {totals["orders"]}')
+        if totals['oldest']:
+            self.stdout.write(f'  oldest: {totals["oldest"]:%Y-%m-%d}')
+        for row in orders.values('status').annotate(count=Count('id')).order_by('status'):
+            self.stdout.write(f'    {row["status"]}: {row["count"]}')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from api.analytics import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily, per-mango and per-customer sales rollup tables from order history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to rebuild (YYYY-MM-DD). Defaults to all history.')
+        parser.add_argument('--end', help='Last day to rebuild (YYYY-MM-DD). Defaults to today.')
+
+    def handle(self, *args, **options):
+        start = end = None
+        try:
+            if options['start']:
+                start = parse_date(options['start'])
+            if options['end']:
+                end = parse_date(options['end'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if (options['start'] and not start) or (options['end'] and not end):
+            raise CommandError('Dates must be in YYYY-MM-DD format.')
+        if start and end and start > end:
+            raise CommandError('--start must not be after --end.')
+
+        days = rebuild_rollups(start=start, end=end)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales rollups for {days} day(s).'))
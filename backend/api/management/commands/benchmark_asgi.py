@@ -0,0 +1,118 @@
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from .load_test import percentile
+
+# Read endpoints with a sync (DRF) and an async (api/async_views.py) variant.
+# {mango} is replaced with --mango-id.
+ENDPOINTS = {
+    'catalog': ('mangoes/', 'async/mangoes/'),
+    'catalog-detail': ('mangoes/{mango}/', 'async/mangoes/{mango}/'),
+    'reviews': ('mango/{mango}/feedbacks/', 'async/mango/{mango}/feedbacks/'),
+    'order-history': ('user-orders-with-items/', 'async/user-orders-with-items/'),
+}
+
+
+def hammer(base_url, path, headers, concurrency, seconds, timeout):
+    """Closed loop: `concurrency` clients send requests back to back for `seconds`."""
+    url = urlsplit(base_url)
+    full_path = f'{url.path.rstrip("/")}/api/{path}'
+    cls = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+    lock = threading.Lock()
+    latencies, errors = [], [0]
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        connection = None
+        while time.perf_counter() < deadline:
+            if connection is None:
+                connection = cls(url.hostname, url.port, timeout=timeout)
+            started = time.perf_counter()
+            try:
+                connection.request('GET', full_path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+                if response.getheader('Connection', '').lower() == 'close':
+                    connection.close()
+                    connection = None
+            except (http.client.HTTPException, OSError):
+                ok = False
+                connection.close()
+                connection = None
+            with lock:
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors[0] += 1
+        if connection is not None:
+            connection.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'errors': errors[0],
+    }
+
+
+class Command(BaseCommand):
+    help = ('Compare throughput and latency of the sync read endpoints served by a WSGI server with the '
+            'async ones served by an ASGI server, at increasing concurrency. Start both servers against '
+            'the same database first (see core/asgi.py).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi-url', default='http://127.0.0.1:8000', help='WSGI server (sync views).')
+        parser.add_argument('--asgi-url', default='http://127.0.0.1:8001', help='ASGI server (async views).')
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS),
+                            help=f'Comma separated subset of: {", ".join(ENDPOINTS)}.')
+        parser.add_argument('--concurrency', default='10,100,500',
+                            help='Comma separated numbers of concurrent clients (default 10,100,500).')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per measurement.')
+        parser.add_argument('--mango-id', type=int, default=1, help='Mango used by the detail and review endpoints.')
+        parser.add_argument('--token', help='API token of a user with orders (required for order-history).')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds.')
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        unknown = [name for name in names if name not in ENDPOINTS]
+        if unknown:
+            raise CommandError(f'Unknown endpoint(s): {", ".join(unknown)}')
+        if 'order-history' in names and not options['token']:
+            raise CommandError('order-history needs --token.')
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError('--concurrency must be a comma separated list of integers.')
+
+        headers = {'Accept': 'application/json'}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+
+        self.stdout.write(f'{"endpoint":<16}{"clients":>8}  {"server":<6}{"req/s":>9}{"p50 ms":>9}'
+                          f'{"p99 ms":>9}{"errors":>8}')
+        for name in names:
+            sync_path, async_path = (path.format(mango=options['mango_id']) for path in ENDPOINTS[name])
+            for concurrency in levels:
+                results = {}
+                for server, base_url, path in (('wsgi', options['wsgi_url'], sync_path),
+                                               ('asgi', options['asgi_url'], async_path)):
+                    result = hammer(base_url, path, headers, concurrency, options['duration'], options['timeout'])
+                    results[server] = result
+                    self.stdout.write(f'{name:<16}{concurrency:>8}  {server:<6}{result["rps"]:>9.1f}'
+                                      f'{result["p50_ms"]:>9.1f}{result["p99_ms"]:>9.1f}{result["errors"]:>8}')
+                if results['wsgi']['rps']:
+                    ratio = results['asgi']['rps'] / results['wsgi']['rps']
+                    self.stdout.write(self.style.SUCCESS(f'{"":<26}asgi/wsgi throughput {ratio:.2f}x'))
@@ -0,0 +1,23 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from api.recommendations import DEFAULT_TOP_N, build_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Build co-purchase ("also bought") recommendations for every mango from order history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Rebuild from all orders instead of only orders not counted by an earlier run.')
+        parser.add_argument('--top', type=int, default=DEFAULT_TOP_N,
+                            help=f'Number of neighbours to keep per mango (default {DEFAULT_TOP_N}).')
+
+    def handle(self, *args, **options):
+        if options['top'] < 1:
+            raise CommandError('--top must be at least 1.')
+        try:
+            new_orders = build_recommendations(full=options['full'], top_n=options['top'])
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Processed {new_orders} new order(s).'))
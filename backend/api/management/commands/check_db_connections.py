@@ -0,0 +1,159 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from api.db_connections import pool_for, pool_stats
+
+
+def backend_id(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT pg_backend_pid()')
+            return cursor.fetchone()[0]
+        cursor.execute('SELECT 1')
+    return id(connection.connection)
+
+
+def simulated_request(connection):
+    # The same signals Django's handlers send, so close_old_connections runs
+    request_started.send(sender=Command)
+    try:
+        return backend_id(connection)
+    finally:
+        request_finished.send(sender=Command)
+
+
+class Command(BaseCommand):
+    help = ('Verify connection handling against the configured database: reuse across requests, '
+            'recovery from a killed connection (PostgreSQL) and pool limits under concurrency (DB_POOL=1).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias (default "default").')
+        parser.add_argument('--requests', type=int, default=5, help='Sequential requests for the reuse check.')
+        parser.add_argument('--extra-threads', type=int, default=5,
+                            help='Threads beyond the pool size in the saturation check.')
+        parser.add_argument('--hold', type=float, default=0.5,
+                            help='Seconds each thread holds its connection in the saturation check.')
+        parser.add_argument('--test-timeout', action='store_true',
+                            help='Also hold connections past DB_POOL_TIMEOUT and expect requests to time out.')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        connection = connections[alias]
+        settings_dict = connection.settings_dict
+        pool = pool_for(alias)
+        if pool is not None:
+            mode = 'pool'
+        elif settings_dict['CONN_MAX_AGE'] != 0:
+            mode = 'persistent'
+        else:
+            mode = 'per-request'
+
+        self.stdout.write(f'database {alias}: {connection.vendor}, mode {mode}, '
+                          f'CONN_MAX_AGE={settings_dict["CONN_MAX_AGE"]}, '
+                          f'CONN_HEALTH_CHECKS={settings_dict["CONN_HEALTH_CHECKS"]}')
+        if pool is not None:
+            self.stdout.write(f'pool: min {pool.min_size}, max {pool.max_size}, timeout {pool.timeout}s')
+
+        self.failures = []
+        connection.close()
+        self.check_reuse(connection, mode, options['requests'])
+        if connection.vendor == 'postgresql' and mode != 'per-request':
+            self.check_recovery(connection, mode)
+        if pool is not None:
+            self.check_saturation(alias, pool, options)
+
+        if self.failures:
+            raise CommandError(f'{len(self.failures)} check(s) failed: {"; ".join(self.failures)}')
+        self.stdout.write(self.style.SUCCESS('All connection checks passed.'))
+
+    def result(self, ok, message):
+        if ok:
+            self.stdout.write(self.style.SUCCESS(f'ok   {message}'))
+        else:
+            self.failures.append(message)
+            self.stdout.write(self.style.ERROR(f'FAIL {message}'))
+
+    def check_reuse(self, connection, mode, count):
+        started = time.perf_counter()
+        ids = [simulated_request(connection) for _ in range(count)]
+        per_request_ms = (time.perf_counter() - started) / count * 1000
+        distinct = len(set(ids))
+        self.stdout.write(f'{count} requests: {distinct} distinct connection(s), {per_request_ms:.1f} ms per request')
+
+        if mode == 'persistent':
+            self.result(distinct == 1 and connection.connection is not None,
+                        'persistent connection reused across requests')
+        elif mode == 'pool':
+            self.result(connection.connection is None,
+                        'connection returned to the pool at the end of each request')
+            self.result(distinct <= connection.pool.max_size, 'requests served by pooled connections')
+        else:
+            self.result(connection.connection is None, 'connection closed at the end of each request')
+
+    def check_recovery(self, connection, mode):
+        victim = simulated_request(connection)
+        # Kill the backend from an independent connection, as a server restart or idle timeout would
+        killer = connection.Database.connect(**connection.get_connection_params())
+        try:
+            killer.autocommit = True
+            with killer.cursor() as cursor:
+                cursor.execute('SELECT pg_terminate_backend(%s)', [victim])
+        finally:
+            killer.close()
+        time.sleep(0.1)
+
+        try:
+            replacement = simulated_request(connection)
+        except Exception as e:
+            self.result(False, f'request after a killed connection failed: {e}')
+            return
+        checker = 'health check' if mode == 'persistent' else 'pool check'
+        self.result(replacement != victim, f'killed connection replaced transparently ({checker})')
+
+    def check_saturation(self, alias, pool, options):
+        threads_count = pool.max_size + options['extra_threads']
+        before = pool_stats(alias)
+        self.run_threads(alias, threads_count, options['hold'])
+        stats = pool_stats(alias)
+        queued = stats.get('requests_queued', 0) - before.get('requests_queued', 0)
+        errors = stats.get('requests_errors', 0) - before.get('requests_errors', 0)
+        self.stdout.write(f'{threads_count} threads holding connections for {options["hold"]}s: '
+                          f'{queued} waited, {errors} failed, pool size {stats.get("pool_size")}')
+        self.result(stats.get('pool_size', 0) <= pool.max_size, 'pool never grew past max_size')
+        self.result(queued > 0 and errors == 0, 'excess requests queued for a connection instead of failing')
+
+        if options['test_timeout']:
+            outcomes = self.run_threads(alias, threads_count, pool.timeout + 1)
+            self.result(outcomes['error'] >= options['extra_threads'],
+                        f'requests waiting longer than {pool.timeout}s timed out ({outcomes["error"]} errors)')
+
+    def run_threads(self, alias, count, hold):
+        outcomes = {'ok': 0, 'error': 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(count)
+
+        def worker():
+            barrier.wait()
+            connection = connections[alias]
+            try:
+                with transaction.atomic(using=alias):
+                    backend_id(connection)
+                    time.sleep(hold)
+                outcome = 'ok'
+            except Exception:
+                outcome = 'error'
+            finally:
+                connection.close()
+            with lock:
+                outcomes[outcome] += 1
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.bulk_import import BulkImportError, apply_import, parse_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk update mango prices and stock from a CSV or JSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (id/name, price, stock_quantity columns) or JSON file.')
+        parser.add_argument('--format', choices=['csv', 'json'], help='Defaults to the file extension.')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and show the diff without saving.')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as f:
+                content = f.read()
+        except OSError as e:
+            raise CommandError(str(e))
+
+        try:
+            rows = parse_rows(content, fmt=options['format'], filename=options['path'])
+            result = apply_import(rows, dry_run=options['dry_run'])
+        except BulkImportError as e:
+            raise CommandError('Import rejected:\n  ' + '\n  '.join(e.errors))
+
+        for row in result['diff']:
+            changes = ', '.join(f'{field} {c["old"]} -> {c["new"]}' for field, c in row['changes'].items())
+            self.stdout.write(f'  #{row["id"]} {row["name"]}: {changes}')
+        verb = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {result["updated"]} mango(es); {result["unchanged"]} unchanged.'
+        ))
@@ -0,0 +1,307 @@
+import http.client
+import json
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Closed-loop load generator for a running server (runserver, gunicorn, ...).
+# Every virtual user is a thread with its own account and keep-alive
+# connection that runs shopping sessions back to back with think time between
+# requests, so the offered load follows the server's latency like real
+# shoppers do. Stages ramp the number of virtual users; results are reported
+# per stage and endpoint.
+
+DEFAULT_MIX = 'browse=60,cart=25,checkout=10,feedback=5'
+SESSIONS = ('browse', 'cart', 'checkout', 'feedback')
+SEARCH_TERMS = ['mango', 'sweet', 'himsagar', 'langra', 'fazli', 'amrapali']
+
+
+def parse_stages(value):
+    stages = []
+    for part in value.split(','):
+        users, _, seconds = part.partition(':')
+        try:
+            stages.append((int(users), float(seconds)))
+        except ValueError:
+            raise CommandError(f'Invalid stage "{part}", expected USERS:SECONDS')
+        if stages[-1][0] < 1 or stages[-1][1] <= 0:
+            raise CommandError(f'Invalid stage "{part}", users and seconds must be positive')
+    return stages
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in SESSIONS:
+            raise CommandError(f'Unknown session "{name}", choose from {", ".join(SESSIONS)}')
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise CommandError(f'Invalid weight for "{name}"')
+    if sum(mix.values()) <= 0:
+        raise CommandError('The session mix needs at least one positive weight.')
+    return mix
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stage = 0
+        self.samples = defaultdict(lambda: {'latencies': [], 'rejected': 0, 'errors': 0})
+
+    def add(self, endpoint, seconds, status):
+        with self.lock:
+            sample = self.samples[(self.stage, endpoint)]
+            sample['latencies'].append(seconds)
+            if status is None or status >= 500:
+                sample['errors'] += 1
+            elif status >= 400:
+                sample['rejected'] += 1
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, number, options, recorder, catalog):
+        super().__init__(daemon=True)
+        self.number = number
+        self.options = options
+        self.recorder = recorder
+        self.catalog = catalog
+        self.stopping = threading.Event()
+        self.rng = random.Random(f'{options["run_id"]}-{number}')
+        self.token = None
+        self.connection = None
+
+    # HTTP
+
+    def connect(self):
+        url = urlsplit(self.options['base_url'])
+        cls = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.connection = cls(url.hostname, url.port, timeout=self.options['timeout'])
+
+    def request(self, method, path, endpoint, body=None, params=None):
+        url = urlsplit(self.options['base_url'])
+        full_path = f'{url.path.rstrip("/")}/api/{path}'
+        if params:
+            full_path += '?' + urlencode(params)
+        headers = {'Accept': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+
+        started = time.perf_counter()
+        status, data = None, None
+        for attempt in range(2):
+            if self.connection is None:
+                self.connect()
+            try:
+                self.connection.request(method, full_path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                raw = response.read()
+                status = response.status
+                if response.getheader('Connection', '').lower() == 'close':
+                    self.connection.close()
+                    self.connection = None
+                try:
+                    data = json.loads(raw) if raw else None
+                except ValueError:
+                    data = None
+                break
+            except (http.client.HTTPException, OSError):
+                # A kept-alive connection the server already closed: reconnect once
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    break
+        if endpoint:
+            self.recorder.add(endpoint, time.perf_counter() - started, status)
+        return status, data
+
+    def think(self):
+        pause = self.options['think']
+        if pause:
+            self.stopping.wait(self.rng.uniform(pause * 0.5, pause * 1.5))
+
+    # Sessions
+
+    def login(self):
+        username = f'load-{self.options["run_id"]}-{self.number}'
+        password = f'load-{self.options["run_id"]}-password'
+        status, data = self.request('POST', 'register/', 'POST register',
+                                    {'username': username, 'password': password, 'email': f'{username}@example.com'})
+        if status != 200:
+            status, data = self.request('POST', 'login/', 'POST login', {'username': username, 'password': password})
+        self.token = (data or {}).get('token') if status == 200 else None
+        return self.token is not None
+
+    def pick_mango(self):
+        return self.rng.choice(self.catalog)
+
+    def browse(self):
+        self.request('GET', 'mangoes/', 'GET mangoes')
+        self.think()
+        self.request('GET', 'mango-search/', 'GET mango-search', params={'q': self.rng.choice(SEARCH_TERMS)})
+        self.think()
+        mango_id = self.pick_mango()
+        self.request('GET', f'mangoes/{mango_id}/', 'GET mangoes/<id>')
+        self.request('GET', f'mango/{mango_id}/feedbacks/', 'GET mango/<id>/feedbacks')
+        self.request('GET', f'mango/{mango_id}/recommendations/', 'GET mango/<id>/recommendations')
+
+    def cart(self):
+        self.request('POST', 'add-to-cart/', 'POST add-to-cart',
+                     {'mango_id': self.pick_mango(), 'quantity': self.rng.randint(1, 3)})
+        self.think()
+        _, items = self.request('GET', 'cart/', 'GET cart')
+        if isinstance(items, list) and items:
+            item = self.rng.choice(items)
+            self.think()
+            if self.rng.random() < 0.5:
+                self.request('PATCH', f'cart-item/{item["id"]}/', 'PATCH cart-item/<id>',
+                             {'quantity': self.rng.randint(1, 3)})
+            else:
+                self.request('DELETE', f'cart-item/{item["id"]}/delete/', 'DELETE cart-item/<id>')
+
+    def checkout(self):
+        for _ in range(self.rng.randint(1, 2)):
+            self.request('POST', 'add-to-cart/', 'POST add-to-cart',
+                         {'mango_id': self.pick_mango(), 'quantity': self.rng.randint(1, 2)})
+            self.think()
+        self.request('GET', 'cart/', 'GET cart')
+        self.think()
+        self.request('POST', 'create-order/', 'POST create-order', {
+            'phone_number': f'017{self.number:08d}',
+            'billing_address': 'Load test billing address',
+            'shipping_address': 'Load test shipping address',
+        })
+        self.think()
+        self.request('GET', 'user-orders/', 'GET user-orders')
+
+    def feedback(self):
+        _, orders = self.request('GET', 'user-orders-with-items/', 'GET user-orders-with-items')
+        self.think()
+        delivered = [item for order in orders or [] if str(order.get('status', '')).lower() == 'delivered'
+                     for item in order.get('items', [])]
+        if delivered:
+            item = self.rng.choice(delivered)
+            self.request('POST', f'order-item/{item["id"]}/feedback/', 'POST order-item/<id>/feedback',
+                         {'rating': self.rng.randint(3, 5), 'comment': 'Load test review'})
+        else:
+            # Nothing delivered yet for this account: read reviews instead
+            self.request('GET', f'mango/{self.pick_mango()}/feedbacks/', 'GET mango/<id>/feedbacks')
+
+    def run(self):
+        if not self.login():
+            return
+        names = list(self.options['mix'])
+        weights = [self.options['mix'][name] for name in names]
+        while not self.stopping.is_set():
+            getattr(self, self.rng.choices(names, weights)[0])()
+            self.think()
+        if self.connection is not None:
+            self.connection.close()
+
+
+class Command(BaseCommand):
+    help = ('Drive a running server with concurrent virtual shoppers (browse / cart / checkout / feedback '
+            'sessions) and report throughput, latency percentiles and error rates per endpoint. '
+            'Creates one account per virtual user; point it at a disposable database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000',
+                            help='Server to test (default http://127.0.0.1:8000).')
+        parser.add_argument('--stages', default='10:30,50:30,100:60',
+                            help='Comma separated USERS:SECONDS ramp steps (default 10:30,50:30,100:60).')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Session weights (default {DEFAULT_MIX}).')
+        parser.add_argument('--think', type=float, default=1.0,
+                            help='Mean think time between requests in seconds (default 1.0, 0 = none).')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds.')
+        parser.add_argument('--seed', default=None, help='Run id / random seed, for repeatable runs.')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this JSON file.')
+
+    def handle(self, *args, **options):
+        options['stages'] = parse_stages(options['stages'])
+        options['mix'] = parse_mix(options['mix'])
+        options['run_id'] = options['seed'] or uuid.uuid4().hex[:8]
+        if urlsplit(options['base_url']).scheme not in ('http', 'https'):
+            raise CommandError('--base-url must be an http:// or https:// URL.')
+
+        recorder = Recorder()
+        catalog = self.load_catalog(options, recorder)
+        users = []
+        results = []
+        for index, (target, seconds) in enumerate(options['stages']):
+            with recorder.lock:
+                recorder.stage = index
+            while len(users) < target:
+                user = VirtualUser(len(users), options, recorder, catalog)
+                users.append(user)
+                user.start()
+            while len(users) > target:
+                users.pop().stopping.set()
+            self.stdout.write(f'stage {index + 1}: {target} virtual users for {seconds:g}s')
+            started = time.perf_counter()
+            time.sleep(seconds)
+            results.append(self.report(index, target, time.perf_counter() - started, recorder))
+
+        for user in users:
+            user.stopping.set()
+        for user in users:
+            user.join(options['timeout'])
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({'run_id': options['run_id'], 'base_url': options['base_url'], 'stages': results}, f, indent=2)
+
+    def load_catalog(self, options, recorder):
+        probe = VirtualUser(-1, options, recorder, [])
+        status, data = probe.request('GET', 'mangoes/', None, params={'fields': 'id'})
+        if status != 200 or not data:
+            raise CommandError(f'Could not load the catalog from {options["base_url"]} (status {status}).')
+        return [mango['id'] for mango in data]
+
+    def report(self, index, users, elapsed, recorder):
+        with recorder.lock:
+            samples = {endpoint: dict(sample, latencies=sorted(sample['latencies']))
+                       for (stage, endpoint), sample in recorder.samples.items() if stage == index}
+
+        rows = []
+        for endpoint, sample in sorted(samples.items()):
+            latencies = sample['latencies']
+            rows.append({
+                'endpoint': endpoint,
+                'requests': len(latencies),
+                'rps': len(latencies) / elapsed,
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+                'max_ms': (latencies[-1] if latencies else 0) * 1000,
+                'rejected': sample['rejected'],
+                'errors': sample['errors'],
+                'error_rate': sample['errors'] / len(latencies) if latencies else 0,
+            })
+
+        self.stdout.write(f'{"endpoint":<36}{"reqs":>7}{"req/s":>8}{"p50":>8}{"p95":>8}{"p99":>8}'
+                          f'{"max":>8}{"4xx":>6}{"err":>6}')
+        for row in rows:
+            line = (f'{row["endpoint"]:<36}{row["requests"]:>7}{row["rps"]:>8.1f}{row["p50_ms"]:>8.0f}'
+                    f'{row["p95_ms"]:>8.0f}{row["p99_ms"]:>8.0f}{row["max_ms"]:>8.0f}{row["rejected"]:>6}'
+                    f'{row["errors"]:>6}')
+            self.stdout.write(self.style.ERROR(line) if row['errors'] else line)
+        total = sum(row['requests'] for row in rows)
+        errors = sum(row['errors'] for row in rows)
+        self.stdout.write(f'total {total} requests, {total / elapsed:.1f} req/s, '
+                          f'{errors} errors ({errors / total if total else 0:.1%})\n')
+        return {'stage': index + 1, 'users': users, 'seconds': elapsed, 'endpoints': rows}
@@ -0,0 +1,16 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from api.reservations import release_expired
+
+logger = logging.getLogger('api.reservations')
+
+
+class Command(BaseCommand):
+    help = 'Delete expired stock reservations. Safe to run as often as every minute.'
+
+    def handle(self, *args, **options):
+        deleted = release_expired()
+        logger.info('reservation sweep: released=%d', deleted)
+        self.stdout.write(self.style.SUCCESS(f'Released {deleted} expired reservation(s).'))
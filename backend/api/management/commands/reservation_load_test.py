@@ -0,0 +1,113 @@
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import Sum
+
+from api.models import MangoCategory, StockReservation
+from api.reservations import InsufficientStock, active, consume, reserve
+
+
+class Command(BaseCommand):
+    help = ('Hammer one mango with concurrent reservations and checkouts and verify stock is '
+            'never oversold. Creates a throwaway mango and users and removes them afterwards. '
+            'Run against PostgreSQL; SQLite serialises writers and only shows lock errors.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stock', type=int, default=100, help='kg in stock for the test mango.')
+        parser.add_argument('--users', type=int, default=200, help='Simulated shoppers.')
+        parser.add_argument('--quantity', type=int, default=1, help='kg each shopper reserves.')
+        parser.add_argument('--threads', type=int, default=20, help='Concurrent worker threads.')
+        parser.add_argument('--checkout-ratio', type=float, default=0.5,
+                            help='Share of successful reservations that go on to check out.')
+
+    def handle(self, *args, **options):
+        if min(options['stock'], options['users'], options['quantity'], options['threads']) < 1:
+            raise CommandError('--stock, --users, --quantity and --threads must be at least 1.')
+
+        tag = uuid.uuid4().hex[:8]
+        mango = MangoCategory.objects.create(
+            name=f'Load test {tag}', price=1, stock_quantity=options['stock'], image='mango_images/load-test.jpg',
+        )
+        User.objects.bulk_create([User(username=f'loadtest-{tag}-{i}') for i in range(options['users'])])
+        users = list(User.objects.filter(username__startswith=f'loadtest-{tag}-'))
+        try:
+            self.run(mango, users, options)
+        finally:
+            StockReservation.objects.filter(mango=mango).delete()
+            User.objects.filter(username__startswith=f'loadtest-{tag}-').delete()
+            mango.delete()
+
+    def run(self, mango, users, options):
+        results = Counter()
+        latencies = []
+        lock = threading.Lock()
+        queue = list(users)
+        checkout_every = int(1 / options['checkout_ratio']) if options['checkout_ratio'] > 0 else 0
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if not queue:
+                            return
+                        user = queue.pop()
+                        position = len(queue)
+                    started = time.perf_counter()
+                    outcome = None
+                    try:
+                        reserve(user, mango.pk, options['quantity'])
+                        outcome = 'reserved'
+                        if checkout_every and position % checkout_every == 0:
+                            with transaction.atomic():
+                                consume(user, {mango.pk: options['quantity']})
+                            outcome = 'checked_out'
+                    except InsufficientStock:
+                        outcome = outcome or 'sold_out'
+                    except OperationalError:
+                        # A failed checkout leaves the reservation in place
+                        outcome = outcome or 'db_error'
+                    with lock:
+                        results[outcome] += 1
+                        latencies.append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        mango.refresh_from_db()
+        held = active().filter(mango=mango).aggregate(total=Sum('quantity'))['total'] or 0
+        sold = options['stock'] - mango.stock_quantity
+        granted = (results['reserved'] + results['checked_out']) * options['quantity']
+        latencies.sort()
+
+        self.stdout.write(f'backend: {connection.vendor}, {len(users)} shoppers, {options["threads"]} threads, '
+                          f'{elapsed:.2f}s')
+        for outcome in ('reserved', 'checked_out', 'sold_out', 'db_error'):
+            self.stdout.write(f'  {outcome}: {results[outcome]}')
+        if latencies:
+            p50 = latencies[len(latencies) // 2] * 1000
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+            self.stdout.write(f'  latency p50 {p50:.1f} ms, p99 {p99:.1f} ms')
+        self.stdout.write(f'  stock left {mango.stock_quantity}, sold {sold}, still reserved {held}')
+
+        problems = []
+        if sold + held > options['stock']:
+            problems.append(f'oversold: {sold} sold + {held} reserved > {options["stock"]} in stock')
+        if sold + held != granted:
+            problems.append(f'{granted} kg granted but {sold + held} kg accounted for')
+        if mango.stock_quantity < 0:
+            problems.append('stock went negative')
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('Stock stayed consistent.'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from api.models import SlowQuery
+from api.slow_queries import flush
+
+
+class Command(BaseCommand):
+    help = 'Show the slowest recorded database queries, grouped by normalised statement.'
+
+    ORDERINGS = {'total': '-total_ms', 'count': '-count', 'max': '-max_ms'}
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help='Number of statements to show.')
+        parser.add_argument('--order', choices=sorted(self.ORDERINGS), default='total',
+                            help='Rank by total time (default), number of occurrences or worst case.')
+        parser.add_argument('--plans', action='store_true', help='Include the captured EXPLAIN plans.')
+        parser.add_argument('--reset', action='store_true', help='Delete all recorded slow queries afterwards.')
+
+    def handle(self, *args, **options):
+        flush()
+        queries = SlowQuery.objects.order_by(self.ORDERINGS[options['order']])[:options['top']]
+        for rank, query in enumerate(queries, start=1):
+            avg = query.total_ms / query.count if query.count else 0
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'#{rank} [{query.fingerprint[:12]}] {query.count}x  total {query.total_ms:.0f} ms  '
+                f'avg {avg:.1f} ms  max {query.max_ms:.1f} ms  view {query.view or "-"}'
+            ))
+            self.stdout.write(f'  {query.sql}')
+            if query.last_params:
+                self.stdout.write(f'  params: {query.last_params}')
+            if options['plans'] and query.plan:
+                for line in query.plan.splitlines():
+                    self.stdout.write(f'    {line}')
+        if not queries:
+            self.stdout.write('No slow queries recorded.')
+
+        if options['reset']:
+            SlowQuery.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS('Slow query log cleared.'))
@@ -0,0 +1,134 @@
+import glob
+import json
+import os
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.tracing import flush
+
+
+def load_spans(paths):
+    spans = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    spans.append(json.loads(line))
+    return spans
+
+
+class Command(BaseCommand):
+    help = ('Analyse recorded request traces (TRACE_DIR/spans-*.jsonl): slowest requests, where their '
+            'time goes, single trace trees, and export for Zipkin or Jaeger.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', action='append', help='Span file(s) to read instead of TRACE_DIR.')
+        parser.add_argument('--name', help='Only requests whose root span name contains this (e.g. create_order).')
+        parser.add_argument('--top', type=int, default=10, help='Number of slowest requests to list.')
+        parser.add_argument('--trace', help='Print the span tree of one trace id.')
+        parser.add_argument('--breakdown', action='store_true',
+                            help='Average time per child span name across the selected requests.')
+        parser.add_argument('--export', metavar='PATH',
+                            help='Write the selected traces as one Zipkin v2 JSON array (Zipkin / Jaeger upload).')
+        parser.add_argument('--clear', action='store_true', help='Delete the span files afterwards.')
+
+    def handle(self, *args, **options):
+        flush()
+        paths = options['file'] or sorted(glob.glob(os.path.join(settings.TRACE_DIR, 'spans-*.jsonl')))
+        try:
+            spans = load_spans(paths)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read spans: {e}')
+
+        traces = defaultdict(list)
+        for span in spans:
+            traces[span['traceId']].append(span)
+
+        if options['trace']:
+            if options['trace'] not in traces:
+                raise CommandError(f'Trace {options["trace"]} not found.')
+            self.print_tree(traces[options['trace']])
+        else:
+            roots = self.roots(traces, options['name'])
+            if options['breakdown']:
+                self.print_breakdown(roots, traces)
+            else:
+                self.print_slowest(roots, traces, options['top'])
+            if options['export']:
+                selected = [span for root in roots for span in traces[root['traceId']]]
+                with open(options['export'], 'w', encoding='utf-8') as f:
+                    json.dump(selected, f)
+                self.stdout.write(self.style.SUCCESS(
+                    f'Wrote {len(selected)} span(s) of {len(roots)} trace(s) to {options["export"]}.'
+                ))
+
+        if options['clear']:
+            for path in paths:
+                os.remove(path)
+            self.stdout.write(self.style.SUCCESS(f'Deleted {len(paths)} span file(s).'))
+
+    def roots(self, traces, name):
+        roots = []
+        for trace_spans in traces.values():
+            ids = {span['id'] for span in trace_spans}
+            # The request span; its parent (if any) lives in the calling service
+            for span in trace_spans:
+                if span.get('kind') == 'SERVER' and span.get('parentId') not in ids:
+                    if not name or name in span['name']:
+                        roots.append(span)
+        return roots
+
+    def print_slowest(self, roots, traces, top):
+        if not roots:
+            self.stdout.write('No traces recorded.')
+            return
+        self.stdout.write(f'{len(roots)} request(s) traced; slowest:')
+        for root in sorted(roots, key=lambda span: -span['duration'])[:top]:
+            queries = [span for span in traces[root['traceId']] if span['name'] == 'db.query']
+            db_ms = sum(span['duration'] for span in queries) / 1000
+            self.stdout.write(
+                f'  {root["duration"] / 1000:9.1f} ms  {root["name"]:<45} {root["tags"].get("http.status_code", "-"):>4}  '
+                f'{len(queries):>3} queries {db_ms:8.1f} ms  trace {root["traceId"]}'
+            )
+
+    def print_breakdown(self, roots, traces):
+        if not roots:
+            self.stdout.write('No traces recorded.')
+            return
+        totals = defaultdict(lambda: [0, 0])
+        for root in roots:
+            for span in traces[root['traceId']]:
+                if span.get('parentId') == root['id']:
+                    totals[span['name']][0] += span['duration']
+                    totals[span['name']][1] += 1
+        request_us = sum(root['duration'] for root in roots)
+        self.stdout.write(f'{len(roots)} request(s), average {request_us / len(roots) / 1000:.1f} ms')
+        self.stdout.write(f'  {"span":<40}{"avg ms":>10}{"calls/req":>11}{"share":>8}')
+        for name, (duration, calls) in sorted(totals.items(), key=lambda item: -item[1][0]):
+            self.stdout.write(f'  {name:<40}{duration / len(roots) / 1000:>10.2f}{calls / len(roots):>11.1f}'
+                              f'{duration / request_us:>8.1%}')
+        untraced = request_us - sum(duration for duration, _ in totals.values())
+        self.stdout.write(f'  {"(not in a child span)":<40}{untraced / len(roots) / 1000:>10.2f}{"":>11}'
+                          f'{untraced / request_us:>8.1%}')
+
+    def print_tree(self, trace_spans):
+        children = defaultdict(list)
+        ids = {span['id'] for span in trace_spans}
+        for span in trace_spans:
+            children[span.get('parentId') if span.get('parentId') in ids else None].append(span)
+        start = min(span['timestamp'] for span in trace_spans)
+
+        def walk(span, depth):
+            detail = span['tags'].get('db.statement') or span['tags'].get('serializer') or ''
+            self.stdout.write(
+                f'{(span["timestamp"] - start) / 1000:9.1f} ms {span["duration"] / 1000:9.2f} ms  '
+                f'{"  " * depth}{span["name"]} {detail[:100]}'.rstrip()
+            )
+            for child in sorted(children[span['id']], key=lambda s: s['timestamp']):
+                walk(child, depth + 1)
+
+        for root in sorted(children[None], key=lambda s: s['timestamp']):
+            walk(root, 0)
@@ -0,0 +1,319 @@
+import json
+import os
+import secrets
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
+
+from django.conf import settings
+
+# In-process request metrics, exported in the Prometheus text format by the
+# /api/metrics/ view. Each worker process keeps its own counters in memory
+# and, when METRICS_DIR is set, periodically writes them to
+# METRICS_DIR/metrics-<pid>.json so the view can add up every worker.
+# Like prometheus_client's multiprocess mode, the counters and histograms of a
+# worker that has exited are folded into METRICS_DIR/metrics-dead.json and
+# its own file removed (its gauges are dropped). That happens when the server
+# reports the exit (mark_process_dead, e.g. from gunicorn's child_exit hook),
+# when collect() finds a file whose pid is no longer running, or when a new
+# worker reuses the pid of an old one.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('Request latency by view.', LATENCY_BUCKETS),
+    'http_response_size_bytes': ('Response body size by view.', SIZE_BUCKETS),
+    'http_request_db_queries': ('Database queries per request by view.', QUERY_BUCKETS),
+}
+COUNTERS = {
+    'http_requests_total': 'Requests by view, method and status.',
+    'http_request_errors_total': 'Requests that raised or returned a 5xx, by view.',
+    'db_connects_total': 'Database connections opened (or taken from the pool) by Django, by alias.',
+}
+# Values set from the current state of each process (labelled with its pid);
+# see api/db_connections.py. Cumulative pool statistics are exported as counters.
+GAUGES = {
+    'db_pool_max_size': ('Configured maximum connections in the pool.', 'gauge'),
+    'db_pool_size': ('Connections currently open in the pool, in use or idle.', 'gauge'),
+    'db_pool_available': ('Idle connections ready to be handed out.', 'gauge'),
+    'db_pool_requests_waiting': ('Requests currently waiting for a connection.', 'gauge'),
+    'db_pool_requests_total': ('Connections requested from the pool.', 'counter'),
+    'db_pool_requests_queued_total': ('Requests that had to wait for a connection.', 'counter'),
+    'db_pool_requests_wait_seconds_total': ('Total time requests spent waiting for a connection.', 'counter'),
+    'db_pool_requests_errors_total': ('Requests that timed out or failed waiting for a connection.', 'counter'),
+    'db_pool_connections_lost_total': ('Connections found broken by the health check.', 'counter'),
+}
+
+# Query counter of the request being handled (set by MetricsMiddleware). The
+# counting wrapper is installed on every connection rather than per request:
+# under ASGI the ORM runs in sync_to_async threads with their own connections,
+# and the context variable follows the request into them.
+request_queries = ContextVar('request_queries', default=None)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+
+def count_queries(execute, sql, params, many, context):
+    counter = request_queries.get()
+    if counter is not None:
+        counter.count += 1
+    return execute(sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    # connection_created receiver
+    if getattr(settings, 'METRICS_ENABLED', True) and count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        # (name, labels) -> [count per bucket..., +Inf count, sum]
+        self.histograms = {}
+        self.gauges = {}
+        self.last_flush = 0.0
+        # Tells this process's snapshot file apart from one left by an earlier process with the same pid
+        self.token = secrets.token_hex(8)
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            self.counters[(name, labels)] += value
+
+    def set(self, name, labels, value):
+        with self.lock:
+            self.gauges[(name, labels)] = value
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        with self.lock:
+            key = (name, labels)
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            series[bisect_left(buckets, value)] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'token': self.token,
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(series)] for (name, labels), series in self.histograms.items()],
+                'gauges': [[name, list(labels) + [['pid', os.getpid()]], value]
+                           for (name, labels), value in self.gauges.items()],
+            }
+
+    def flush_due(self, interval):
+        """True at most once per interval, for the caller that should write the snapshot."""
+        if not getattr(settings, 'METRICS_DIR', None):
+            return False
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_flush < interval:
+                return False
+            self.last_flush = now
+            return True
+
+    def flush(self):
+        write_snapshot(settings.METRICS_DIR, self.snapshot())
+
+    def maybe_flush(self, interval):
+        if self.flush_due(interval):
+            self.flush()
+
+
+registry = MetricsRegistry()
+
+
+DEAD_FILE = 'metrics-dead.json'
+
+
+def _snapshot_path(directory, pid):
+    return os.path.join(directory, f'metrics-{pid}.json')
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path, snapshot):
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _directory_lock(directory):
+    # Serialises folding files into metrics-dead.json across worker processes
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, '.metrics.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _fold_dead(directory, path, token=None):
+    """Add a dead process's counters and histograms to metrics-dead.json and remove its file.
+    With token, only a file written by that process is folded."""
+    with _directory_lock(directory):
+        snapshot = _read(path)
+        if snapshot is None or (token is not None and snapshot.get('token') != token):
+            return
+        counters, histograms, _ = merge([_read(os.path.join(directory, DEAD_FILE)) or {}, snapshot])
+        _write(os.path.join(directory, DEAD_FILE), {
+            'counters': [[name, [list(pair) for pair in labels], value] for (name, labels), value in counters.items()],
+            'histograms': [[name, [list(pair) for pair in labels], series] for (name, labels), series in histograms.items()],
+        })
+        os.remove(path)
+
+
+def mark_process_dead(pid, directory=None):
+    """Fold an exited worker's metrics into the dead-process totals.
+    Call from the server's worker-exit hook, e.g. in gunicorn.conf.py:
+    `def child_exit(server, worker): mark_process_dead(worker.pid)`."""
+    directory = directory or getattr(settings, 'METRICS_DIR', None)
+    if directory and os.path.exists(_snapshot_path(directory, pid)):
+        _fold_dead(directory, _snapshot_path(directory, pid))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def write_snapshot(directory, snapshot):
+    os.makedirs(directory, exist_ok=True)
+    path = _snapshot_path(directory, os.getpid())
+    # A file from an earlier process with our pid: keep its totals before replacing it
+    previous = _read(path)
+    if previous is not None and previous.get('token') != snapshot['token']:
+        _fold_dead(directory, path, token=previous.get('token'))
+    _write(path, snapshot)
+
+
+def prune_dead(directory):
+    """Fold the files of worker pids that are no longer running."""
+    for filename in os.listdir(directory):
+        pid = filename[len('metrics-'):-len('.json')]
+        if filename.startswith('metrics-') and filename.endswith('.json') and pid.isdigit():
+            path = os.path.join(directory, filename)
+            # Read the token first so a new process that takes over the pid meanwhile keeps its file
+            token = (_read(path) or {}).get('token')
+            if int(pid) != os.getpid() and not _pid_alive(int(pid)):
+                _fold_dead(directory, path, token=token)
+
+
+def collect():
+    """Merge this process's metrics with those written by other workers."""
+    snapshots = [registry.snapshot()]
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if directory and os.path.isdir(directory):
+        write_snapshot(directory, snapshots[0])
+        prune_dead(directory)
+        snapshots = []
+        for filename in os.listdir(directory):
+            if filename.startswith('metrics-') and filename.endswith('.json'):
+                snapshot = _read(os.path.join(directory, filename))
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+    return merge(snapshots)
+
+
+def merge(snapshots):
+    counters = defaultdict(float)
+    histograms = {}
+    gauges = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot.get('gauges', []):
+            gauges[(name, tuple(tuple(pair) for pair in labels))] = value
+        for name, labels, value in snapshot.get('counters', []):
+            counters[(name, tuple(tuple(pair) for pair in labels))] += value
+        for name, labels, series in snapshot.get('histograms', []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            if key in histograms:
+                histograms[key] = [a + b for a, b in zip(histograms[key], series)]
+            else:
+                histograms[key] = list(series)
+    return counters, histograms, gauges
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render_prometheus():
+    counters, histograms, gauges = collect()
+    lines = []
+
+    for name, help_text in COUNTERS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (metric, labels), series in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], series[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {int(cumulative)}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_number(series[-1])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {int(cumulative)}')
+
+    for name, (help_text, metric_type) in GAUGES.items():
+        series = sorted((labels, value) for (metric, labels), value in gauges.items() if metric == name)
+        if not series:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for labels, value in series:
+            lines.append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+
+    return '\n'.join(lines) + '\n'
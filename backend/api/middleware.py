@@ -0,0 +1,287 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from .compression import compress, compress_stream, compressible, negotiate
+from .db_connections import record_pool_metrics
+from .metrics import QueryCounter, registry, request_queries
+from .profiling import run_profiled, run_profiled_async, save_capture, valid_token
+from .slow_queries import current_request
+from .tracing import current_span, start_trace
+from . import tracing
+
+
+class HybridMiddleware:
+    """Base for middleware that runs natively under both WSGI and ASGI.
+
+    Under ASGI, Django would otherwise run sync-only middleware through
+    sync_to_async, serialising every request on one thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """Record count, latency, size and DB queries for every request, labelled by resolved view."""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.enabled = getattr(settings, 'METRICS_ENABLED', True)
+        self.flush_interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        queries = QueryCounter()
+        token = request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        except Exception:
+            self.record(request, request.method, 500, started, queries, None)
+            registry.maybe_flush(self.flush_interval)
+            raise
+        finally:
+            request_queries.reset(token)
+        self.record(request, request.method, response.status_code, started, queries, response)
+        registry.maybe_flush(self.flush_interval)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        queries = QueryCounter()
+        token = request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        except Exception:
+            self.record(request, request.method, 500, started, queries, None)
+            await self.aflush()
+            raise
+        finally:
+            request_queries.reset(token)
+        self.record(request, request.method, response.status_code, started, queries, response)
+        await self.aflush()
+        return response
+
+    async def aflush(self):
+        # Writing the snapshot is file I/O; keep it off the event loop
+        if registry.flush_due(self.flush_interval):
+            await sync_to_async(registry.flush, thread_sensitive=False)()
+
+    def record(self, request, method, status, started, queries, response):
+        elapsed = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        labels = (('view', view),)
+
+        registry.inc('http_requests_total', labels + (('method', method), ('status', str(status))))
+        if status >= 500:
+            registry.inc('http_request_errors_total', labels)
+        registry.observe('http_request_duration_seconds', labels, elapsed)
+        registry.observe('http_request_db_queries', labels, queries.count)
+        if response is not None and not response.streaming:
+            registry.observe('http_response_size_bytes', labels, len(response.content))
+        record_pool_metrics()
+
+
+class ProfilerMiddleware(HybridMiddleware):
+    """Profile a single request when a staff user or a signed header asks for it."""
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if 'profile' not in request.GET and 'HTTP_X_PROFILE_TOKEN' not in request.META:
+            return self.get_response(request)
+
+        mode = self.profile_mode(request)
+        if mode is None:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        response, profiler = run_profiled(mode, lambda: self.get_response(request))
+        self.save(request, response, profiler, mode, started)
+        return response
+
+    async def __acall__(self, request):
+        if 'profile' not in request.GET and 'HTTP_X_PROFILE_TOKEN' not in request.META:
+            return await self.get_response(request)
+
+        # Resolving the user may hit the database
+        mode = await sync_to_async(self.profile_mode)(request)
+        if mode is None:
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        response, profiler = await run_profiled_async(mode, lambda: self.get_response(request))
+        await sync_to_async(self.save)(request, response, profiler, mode, started)
+        return response
+
+    def save(self, request, response, profiler, mode, started):
+        elapsed = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        capture_id = save_capture(profiler, {
+            'view': match.view_name if match else None,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 2),
+            'mode': mode,
+            'created': timezone.now().isoformat(),
+        })
+        response['X-Profile-Id'] = capture_id
+
+    def profile_mode(self, request):
+        mode = 'sample' if 'sample' in (request.GET.get('profile'), request.headers.get('X-Profile-Mode')) else 'cprofile'
+        token = request.headers.get('X-Profile-Token')
+        if token:
+            return mode if valid_token(token) else None
+
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            # API clients authenticate with DRF tokens, which only the view resolves
+            try:
+                user = (TokenAuthentication().authenticate(request) or (None, None))[0]
+            except AuthenticationFailed:
+                user = None
+        return mode if user is not None and user.is_staff else None
+
+
+class SlowQueryMiddleware(HybridMiddleware):
+    """Remember which request is running so slow queries can be attributed to its view."""
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            current_request.reset(token)
+
+    async def __acall__(self, request):
+        token = current_request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            current_request.reset(token)
+
+
+class TracingMiddleware(HybridMiddleware):
+    """Give every request a trace id and record spans for sampled ones (see api/tracing.py)."""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.enabled = tracing.enabled()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        root = start_trace(f'{request.method} {request.path}', request.headers.get('traceparent'))
+        token = current_span.set(root)
+        try:
+            response = self.get_response(request)
+        except Exception:
+            self.finish(request, root, 500, None)
+            raise
+        finally:
+            current_span.reset(token)
+        self.finish(request, root, response.status_code, response)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        root = start_trace(f'{request.method} {request.path}', request.headers.get('traceparent'))
+        token = current_span.set(root)
+        try:
+            response = await self.get_response(request)
+        except Exception:
+            self.finish(request, root, 500, None)
+            raise
+        finally:
+            current_span.reset(token)
+        self.finish(request, root, response.status_code, response)
+        return response
+
+    def finish(self, request, root, status, response):
+        match = getattr(request, 'resolver_match', None)
+        if match:
+            root.name = f'{request.method} {match.view_name}'
+        root.tags.update({'http.method': request.method, 'http.path': request.path, 'http.status_code': status})
+        if status >= 500:
+            root.tags['error'] = str(status)
+        root.finish()
+        if response is not None:
+            response['X-Trace-Id'] = root.trace_id
+
+
+class CompressionMiddleware(HybridMiddleware):
+    """Negotiated gzip / brotli compression, reusing cached compressed payloads when available."""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.process(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process(request, await self.get_response(request))
+
+    def process(self, request, response):
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        if response.has_header('Content-Encoding') or response.status_code not in (200, 201):
+            return response
+        if response.streaming and response.is_async:
+            # compress_stream works on sync iterators only
+            return response
+        if not compressible(response.get('Content-Type')):
+            return response
+        encoding = negotiate(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            if len(response.content) < self.min_size:
+                return response
+            payload = getattr(response, 'cached_payload', None)
+            compressed = payload.compressed(encoding) if payload else compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The representation changed, so a strong ETag no longer applies
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
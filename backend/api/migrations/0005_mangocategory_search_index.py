@@ -0,0 +1,78 @@
+from django.db import migrations
+
+
+# The tsvector expression must match PG_SEARCH_DOCUMENT in api/search.py.
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE INDEX IF NOT EXISTS api_mango_search_gin ON api_mangocategory USING gin ((
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ))
+    """,
+    "CREATE INDEX IF NOT EXISTS api_mango_name_trgm ON api_mangocategory USING gin (name gin_trgm_ops)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS api_mango_name_trgm",
+    "DROP INDEX IF EXISTS api_mango_search_gin",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS api_mangocategory_fts USING fts5(
+        name, description, content='api_mangocategory', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_mangocategory_fts_ai AFTER INSERT ON api_mangocategory BEGIN
+        INSERT INTO api_mangocategory_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_mangocategory_fts_ad AFTER DELETE ON api_mangocategory BEGIN
+        INSERT INTO api_mangocategory_fts(api_mangocategory_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_mangocategory_fts_au AFTER UPDATE ON api_mangocategory BEGIN
+        INSERT INTO api_mangocategory_fts(api_mangocategory_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO api_mangocategory_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    "INSERT INTO api_mangocategory_fts(api_mangocategory_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS api_mangocategory_fts_au",
+    "DROP TRIGGER IF EXISTS api_mangocategory_fts_ad",
+    "DROP TRIGGER IF EXISTS api_mangocategory_fts_ai",
+    "DROP TABLE IF EXISTS api_mangocategory_fts",
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_categoryfeedback_delete_orderfeedback"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({"postgresql": POSTGRES_FORWARD, "sqlite": SQLITE_FORWARD}),
+            run_statements({"postgresql": POSTGRES_BACKWARD, "sqlite": SQLITE_BACKWARD}),
+        ),
+    ]
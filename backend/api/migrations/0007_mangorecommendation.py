@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MangoRecommendation',
+            fields=[
+                ('mango', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation', serialize=False, to='api.mangocategory')),
+                ('order_count', models.IntegerField(default=0)),
+                ('co_counts', models.JSONField(default=dict)),
+                ('neighbours', models.JSONField(default=list)),
+                ('built_through_order_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_slowquery'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        # Run after auth's own migrations, which rebuild auth_user on SQLite
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='categoryfeedback',
+            index=models.Index(fields=['mango_category', '-created_at'], name='feedback_mango_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='categoryfeedback',
+            index=models.Index(fields=['-created_at'], name='feedback_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-order_date'], name='order_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-order_date'], name='order_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', '-order_date'], name='order_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('payment_status', 'Pending')), fields=['payment_status'], name='payment_pending_idx'),
+        ),
+        # auth_user belongs to django.contrib.auth, so its email indexes are plain SQL:
+        # one for exact lookups and one for case-insensitive (UPPER) email__iexact lookups.
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS auth_user_email_idx ON auth_user (email)',
+            reverse_sql='DROP INDEX IF EXISTS auth_user_email_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS auth_user_email_upper_idx ON auth_user (UPPER(email))',
+            reverse_sql='DROP INDEX IF EXISTS auth_user_email_upper_idx',
+        ),
+    ]
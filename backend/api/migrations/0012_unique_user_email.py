@@ -0,0 +1,37 @@
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Upper
+
+
+def check_duplicate_emails(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    duplicates = list(
+        User.objects.exclude(email='')
+        .annotate(email_upper=Upper('email'))
+        .values('email_upper')
+        .annotate(accounts=Count('id'))
+        .filter(accounts__gt=1)
+        .values_list('email_upper', flat=True)[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            'Cannot make emails unique, these are used by more than one account '
+            '(case-insensitive): ' + ', '.join(duplicates)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_stockreservation'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        # Accounts without an email are exempt. Being partial, this index only enforces
+        # uniqueness; lookups keep using auth_user_email_upper_idx from 0010.
+        migrations.RunSQL(
+            "CREATE UNIQUE INDEX IF NOT EXISTS auth_user_email_upper_uniq ON auth_user (UPPER(email)) WHERE email <> ''",
+            reverse_sql='DROP INDEX IF EXISTS auth_user_email_upper_uniq',
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:30
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+PREVIEW_NAMES = 3
+BATCH_SIZE = 1000
+
+
+def backfill_order_summaries(apps, schema_editor):
+    # Same rules as api.models.order_summary, copied so the migration stays stable
+    Order = apps.get_model('api', 'Order')
+    OrderItem = apps.get_model('api', 'OrderItem')
+    last_id = 0
+    while True:
+        orders = list(Order.objects.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+        if not orders:
+            break
+        last_id = orders[-1].id
+        lines = defaultdict(list)
+        items = (OrderItem.objects.filter(order_id__in=[o.id for o in orders])
+                 .order_by('id').values_list('order_id', 'mango__name', 'quantity'))
+        for order_id, name, quantity in items:
+            lines[order_id].append((name, quantity))
+        for order in orders:
+            names = list(dict.fromkeys(name for name, _ in lines[order.id]))
+            preview = ', '.join(names[:PREVIEW_NAMES])
+            if len(names) > PREVIEW_NAMES:
+                preview += f' +{len(names) - PREVIEW_NAMES} more'
+            order.item_count = len(lines[order.id])
+            order.total_kg = sum(quantity for _, quantity in lines[order.id])
+            order.items_preview = preview[:255]
+        Order.objects.bulk_update(orders, ['item_count', 'total_kg', 'items_preview'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_unique_user_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items_preview',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_kg',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_order_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_order_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='categoryfeedback',
+            name='order_item',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='feedback', to='api.orderitem'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('order_date', models.DateTimeField()),
+                ('status', models.CharField(max_length=20)),
+                ('billing_address', models.TextField(blank=True, null=True)),
+                ('shipping_address', models.TextField(blank=True, null=True)),
+                ('phone_number', models.CharField(blank=True, max_length=20, null=True)),
+                ('additional_phone', models.CharField(blank=True, max_length=20, null=True)),
+                ('payment_method', models.CharField(max_length=50)),
+                ('item_count', models.IntegerField(default=0)),
+                ('total_kg', models.IntegerField(default=0)),
+                ('items_preview', models.CharField(blank=True, default='', max_length=255)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.IntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('mango', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_order_items', to='api.mangocategory')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orderitem_set', related_query_name='orderitem', to='api.archivedorder')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='categoryfeedback',
+            name='archived_order_item',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='feedback', to='api.archivedorderitem'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedPayment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('payment_method', models.CharField(max_length=50)),
+                ('payment_status', models.CharField(max_length=20)),
+                ('payment_date', models.DateTimeField()),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='payment', to='api.archivedorder')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['user', '-order_date'], name='archived_order_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['-order_date'], name='archived_order_date_idx'),
+        ),
+    ]
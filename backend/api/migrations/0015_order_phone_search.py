@@ -0,0 +1,102 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:37
+
+import re
+
+from django.db import migrations, models
+
+COUNTRY_CODE = '880'
+BATCH_SIZE = 1000
+
+# pg_trgm GIN indexes for substring search (see search_orders in api/search.py).
+# The address index is on UPPER() because that is what __icontains compares.
+# Built CONCURRENTLY so a large order table stays writable meanwhile.
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+] + [
+    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_{name}_trgm ON {table} USING gin ({expression} gin_trgm_ops)"
+    for table in ('api_order', 'api_archivedorder')
+    for name, expression in (
+        ('phone', 'phone_digits'),
+        ('additional_phone', 'additional_phone_digits'),
+        ('shipping_address', 'UPPER(shipping_address)'),
+    )
+]
+
+POSTGRES_BACKWARD = [
+    f"DROP INDEX CONCURRENTLY IF EXISTS {table}_{name}_trgm"
+    for table in ('api_order', 'api_archivedorder')
+    for name in ('phone', 'additional_phone', 'shipping_address')
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+def normalize_phone(value):
+    # Same rules as api.models.normalize_phone, copied so the migration stays stable
+    digits = re.sub(r'\D', '', value or '')
+    if digits.startswith('00'):
+        digits = digits[2:]
+    if digits.startswith(COUNTRY_CODE) and len(digits) > 11:
+        digits = digits[len(COUNTRY_CODE):]
+    # National mobile numbers have 11 digits with a leading 0 that is often left out
+    if len(digits) == 10 and digits.startswith('1'):
+        digits = '0' + digits
+    return digits[:20]
+
+
+def backfill_phone_digits(apps, schema_editor):
+    for model_name in ('Order', 'ArchivedOrder'):
+        model = apps.get_model('api', model_name)
+        last_id = 0
+        while True:
+            orders = list(model.objects.filter(id__gt=last_id).order_by('id')
+                          .only('id', 'phone_number', 'additional_phone')[:BATCH_SIZE])
+            if not orders:
+                break
+            last_id = orders[-1].id
+            for order in orders:
+                order.phone_digits = normalize_phone(order.phone_number)
+                order.additional_phone_digits = normalize_phone(order.additional_phone)
+            model.objects.bulk_update(orders, ['phone_digits', 'additional_phone_digits'])
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0014_order_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorder',
+            name='additional_phone_digits',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='phone_digits',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='additional_phone_digits',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='phone_digits',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(backfill_phone_digits, migrations.RunPython.noop),
+        migrations.RunPython(
+            run_statements({'postgresql': POSTGRES_FORWARD}),
+            run_statements({'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
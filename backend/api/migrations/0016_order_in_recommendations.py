@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:50
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def flag_built_orders(apps, schema_editor):
+    # Orders up to the old watermark were already counted by the last build
+    MangoRecommendation = apps.get_model('api', 'MangoRecommendation')
+    built_through = MangoRecommendation.objects.aggregate(last=Max('built_through_order_id'))['last']
+    if not built_through:
+        return
+    for model_name in ('Order', 'ArchivedOrder'):
+        apps.get_model('api', model_name).objects.filter(id__lte=built_through).update(in_recommendations=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_order_phone_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorder',
+            name='in_recommendations',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='in_recommendations',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(flag_built_orders, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='mangorecommendation',
+            name='built_through_order_id',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('in_recommendations', False)), fields=['id'], name='order_recs_pending_idx'),
+        ),
+    ]
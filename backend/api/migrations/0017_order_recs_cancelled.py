@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def unflag_cancelled_orders(apps, schema_editor):
+    # 0016 flagged every order up to the old watermark, but builds never
+    # counted cancelled ones; left flagged, the next build would subtract them
+    for model_name in ('Order', 'ArchivedOrder'):
+        apps.get_model('api', model_name).objects.filter(
+            in_recommendations=True, status__iexact='cancelled',
+        ).update(in_recommendations=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_order_in_recommendations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(unflag_cancelled_orders, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('in_recommendations', True), ('status__iexact', 'cancelled')), fields=['id'], name='order_recs_cancelled_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:14
+
+import re
+
+from django.db import migrations, models
+
+COUNTRY_CODE = '880'
+BATCH_SIZE = 1000
+
+
+def normalize_phone(value):
+    # Same rules as api.models.normalize_phone, copied so the migration stays stable
+    digits = re.sub(r'\D', '', value or '')
+    if digits.startswith('00'):
+        digits = digits[2:]
+    if digits.startswith(COUNTRY_CODE) and len(digits) > 11:
+        digits = digits[len(COUNTRY_CODE):]
+    # National mobile numbers have 11 digits with a leading 0 that is often left out
+    if len(digits) == 10 and digits.startswith('1'):
+        digits = '0' + digits
+    return digits[:20]
+
+
+def backfill_phone_digits(apps, schema_editor):
+    UserProfile = apps.get_model('api', 'UserProfile')
+    last_id = 0
+    while True:
+        profiles = list(UserProfile.objects.filter(id__gt=last_id).exclude(phone_number=None).order_by('id')
+                        .only('id', 'phone_number')[:BATCH_SIZE])
+        if not profiles:
+            break
+        last_id = profiles[-1].id
+        for profile in profiles:
+            profile.phone_digits = normalize_phone(profile.phone_number)
+        UserProfile.objects.bulk_update(profiles, ['phone_digits'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_order_recs_cancelled'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='payment',
+            name='payment_pending_idx',
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='phone_digits',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(backfill_phone_digits, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('payment_status', 'pending'), ('payment_status', 'Pending'), _connector='OR'), fields=['payment_status'], name='payment_pending_idx'),
+        ),
+    ]
@@ -1,5 +1,8 @@
+import re
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -8,10 +11,19 @@ class UserProfile(models.Model):
     additional_phone = models.CharField(max_length=20, blank=True, null=True)
     billing_address = models.TextField(blank=True, null=True)
     shipping_address = models.TextField(blank=True, null=True)
+    # Digits-only phone number for the admin search (see normalize_phone)
+    phone_digits = models.CharField(max_length=20, blank=True, default='', editable=False, db_index=True)
     
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
+    def save(self, *args, **kwargs):
+        self.phone_digits = normalize_phone(self.phone_number)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone_number' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_digits'}
+        super().save(*args, **kwargs)
+
 class MangoCategory(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
@@ -25,6 +37,13 @@ class MangoCategory(models.Model):
 
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_activity = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def touch(self):
+        # Record cart activity without rewriting the whole row
+        self.last_activity = timezone.now()
+        Cart.objects.filter(pk=self.pk).update(last_activity=self.last_activity)
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE)
@@ -42,10 +61,80 @@ class Order(models.Model):
     phone_number = models.CharField(max_length=20, blank=True, null=True)
     additional_phone = models.CharField(max_length=20, blank=True, null=True)
     payment_method = models.CharField(max_length=50, default="Cash on Delivery")
+    # Summary of the order's items, written at checkout so order lists never read OrderItem
+    item_count = models.IntegerField(default=0)
+    total_kg = models.IntegerField(default=0)
+    items_preview = models.CharField(max_length=255, blank=True, default='')
+    # Digits-only phone numbers for order search (see normalize_phone and api/search.py)
+    phone_digits = models.CharField(max_length=20, blank=True, default='', editable=False)
+    additional_phone_digits = models.CharField(max_length=20, blank=True, default='', editable=False)
+    # Set while the order is counted in MangoRecommendation (api/recommendations.py)
+    in_recommendations = models.BooleanField(default=False, editable=False)
 
     def __str__(self):
         return f"Order #{self.id} - {self.user.username}"
 
+    def save(self, *args, **kwargs):
+        self.phone_digits = normalize_phone(self.phone_number)
+        self.additional_phone_digits = normalize_phone(self.additional_phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            # in_recommendations is only written by the recommendations build; a
+            # full-row save of a stale instance (admin, API) must not reset it
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'in_recommendations'
+            ]
+        elif update_fields is not None and {'phone_number', 'additional_phone'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'phone_digits', 'additional_phone_digits'}
+        super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-order_date'], name='order_user_date_idx'),
+            models.Index(fields=['-order_date'], name='order_date_idx'),
+            models.Index(fields=['status', '-order_date'], name='order_status_date_idx'),
+            models.Index(fields=['id'], condition=models.Q(in_recommendations=False), name='order_recs_pending_idx'),
+            # Counted orders cancelled since, to be taken out by the next build
+            models.Index(fields=['id'], condition=models.Q(in_recommendations=True, status__iexact='cancelled'),
+                         name='order_recs_cancelled_idx'),
+        ]
+
+
+# Country calling code stripped by normalize_phone (Bangladesh)
+PHONE_COUNTRY_CODE = '880'
+
+
+def normalize_phone(value):
+    """Digits-only national form of a phone number: '+880 1711-234567' -> '01711234567'."""
+    digits = re.sub(r'\D', '', value or '')
+    if digits.startswith('00'):
+        digits = digits[2:]
+    if digits.startswith(PHONE_COUNTRY_CODE) and len(digits) > 11:
+        digits = digits[len(PHONE_COUNTRY_CODE):]
+    # National mobile numbers have 11 digits with a leading 0 that is often left out
+    if len(digits) == 10 and digits.startswith('1'):
+        digits = '0' + digits
+    return digits[:20]
+
+
+# Mango names shown in an order's items_preview before "+N more"
+ORDER_PREVIEW_NAMES = 3
+
+
+def order_summary(lines):
+    """Summary fields for an order from its (mango name, quantity) lines."""
+    lines = list(lines)
+    names = list(dict.fromkeys(name for name, _ in lines))
+    preview = ', '.join(names[:ORDER_PREVIEW_NAMES])
+    if len(names) > ORDER_PREVIEW_NAMES:
+        preview += f' +{len(names) - ORDER_PREVIEW_NAMES} more'
+    return {
+        'item_count': len(lines),
+        'total_kg': sum(quantity for _, quantity in lines),
+        'items_preview': preview[:255],
+    }
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
@@ -60,9 +149,20 @@ class Payment(models.Model):
     payment_status = models.CharField(max_length=20, default="Pending")
     payment_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Only unsettled payments are looked up by status; the admin's
+            # PaymentStatusFilter matches both spellings of the value
+            models.Index(fields=['payment_status'], name='payment_pending_idx',
+                         condition=models.Q(payment_status='pending') | models.Q(payment_status='Pending')),
+        ]
+
 
 class CategoryFeedback(models.Model):
-    order_item = models.OneToOneField(OrderItem, on_delete=models.CASCADE, related_name='feedback')
+    # When the order is archived the feedback stays (it counts towards ratings)
+    # and moves from order_item to archived_order_item
+    order_item = models.OneToOneField(OrderItem, on_delete=models.CASCADE, related_name='feedback', null=True, blank=True)
+    archived_order_item = models.OneToOneField('ArchivedOrderItem', on_delete=models.SET_NULL, related_name='feedback', null=True, blank=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     mango_category = models.ForeignKey(MangoCategory, on_delete=models.CASCADE, related_name='feedbacks')
     rating = models.IntegerField(choices=[(1, '1 Star'), (2, '2 Stars'), (3, '3 Stars'), (4, '4 Stars'), (5, '5 Stars')])
@@ -77,3 +177,141 @@ class CategoryFeedback(models.Model):
         verbose_name = "Category Feedback"
         verbose_name_plural = "Category Feedbacks"
         unique_together = ['order_item', 'user']
+        indexes = [
+            models.Index(fields=['mango_category', '-created_at'], name='feedback_mango_created_idx'),
+            models.Index(fields=['-created_at'], name='feedback_created_idx'),
+        ]
+
+
+# Archive tier for old, finished orders (see api/archive.py).
+# `python manage.py archive_orders` moves orders with their items and payment
+# here. Rows keep their original ids and field names, so the order serializers
+# render them unchanged; read endpoints include them with ?include_archived=1.
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    order_date = models.DateTimeField()
+    status = models.CharField(max_length=20)
+    billing_address = models.TextField(blank=True, null=True)
+    shipping_address = models.TextField(blank=True, null=True)
+    phone_number = models.CharField(max_length=20, blank=True, null=True)
+    additional_phone = models.CharField(max_length=20, blank=True, null=True)
+    payment_method = models.CharField(max_length=50)
+    item_count = models.IntegerField(default=0)
+    total_kg = models.IntegerField(default=0)
+    items_preview = models.CharField(max_length=255, blank=True, default='')
+    phone_digits = models.CharField(max_length=20, blank=True, default='', editable=False)
+    additional_phone_digits = models.CharField(max_length=20, blank=True, default='', editable=False)
+    in_recommendations = models.BooleanField(default=False, editable=False)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived order #{self.id} - {self.user.username}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-order_date'], name='archived_order_user_date_idx'),
+            models.Index(fields=['-order_date'], name='archived_order_date_idx'),
+        ]
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    # Same accessor as Order.orderitem_set so OrderWithItemsSerializer works on both
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='orderitem_set', related_query_name='orderitem')
+    mango = models.ForeignKey(MangoCategory, on_delete=models.CASCADE, related_name='archived_order_items')
+    quantity = models.IntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+
+class ArchivedPayment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.OneToOneField(ArchivedOrder, on_delete=models.CASCADE, related_name='payment')
+    payment_method = models.CharField(max_length=50)
+    payment_status = models.CharField(max_length=20)
+    payment_date = models.DateTimeField()
+
+
+# Pre-aggregated sales figures for admin analytics (see api/analytics.py).
+# Maintained incrementally from create_order / order status updates and
+# rebuilt with `python manage.py backfill_sales_rollups`.
+class DailySalesRollup(models.Model):
+    date = models.DateField(unique=True)
+    order_count = models.IntegerField(default=0)
+    kg_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"Sales on {self.date}"
+
+
+class MangoSalesRollup(models.Model):
+    date = models.DateField()
+    mango = models.ForeignKey(MangoCategory, on_delete=models.CASCADE, related_name='sales_rollups')
+    order_count = models.IntegerField(default=0)
+    kg_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['date', 'mango']
+
+
+class CustomerSalesRollup(models.Model):
+    date = models.DateField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sales_rollups')
+    order_count = models.IntegerField(default=0)
+    kg_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['date', 'user']
+
+
+# Precomputed "customers who bought X also bought" data, one row per mango.
+# Built by `python manage.py build_recommendations` (see api/recommendations.py).
+class MangoRecommendation(models.Model):
+    mango = models.OneToOneField(MangoCategory, on_delete=models.CASCADE, primary_key=True, related_name='recommendation')
+    order_count = models.IntegerField(default=0)
+    co_counts = models.JSONField(default=dict)
+    neighbours = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Recommendations for {self.mango.name}"
+
+
+# Slow queries seen in production, one row per normalised statement.
+# Written by api/slow_queries.py; see `python manage.py slow_queries`.
+class SlowQuery(models.Model):
+    fingerprint = models.CharField(max_length=32, unique=True)
+    sql = models.TextField()
+    view = models.CharField(max_length=200, blank=True)
+    count = models.IntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    last_params = models.JSONField(default=list, blank=True)
+    plan = models.TextField(blank=True)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.fingerprint} ({self.count}x, max {self.max_ms:.0f} ms)"
+
+
+# Time-limited hold on stock for an item in a user's cart (see api/reservations.py)
+class StockReservation(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_reservations')
+    mango = models.ForeignKey(MangoCategory, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ['user', 'mango']
+        indexes = [
+            models.Index(fields=['mango', 'expires_at'], name='reservation_mango_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} kg of {self.mango.name} for {self.user.username}"
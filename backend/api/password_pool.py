@@ -0,0 +1,97 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+logger = logging.getLogger('api.passwords')
+
+# Password hashing off the request thread.
+# PBKDF2 is deliberately slow and holds the GIL, so a worker hashing a
+# password can serve nothing else. Hashes are computed in a pool of
+# PASSWORD_HASH_WORKERS processes instead (per web process; see settings).
+# At most PASSWORD_HASH_MAX_PENDING hashes are queued or running per web
+# process; callers that cannot get a slot within PASSWORD_HASH_WAIT seconds
+# get PasswordHashingBusy (the views answer 503 with Retry-After).
+# PASSWORD_HASH_WORKERS = 0 hashes inline.
+
+
+class PasswordHashingBusy(Exception):
+    pass
+
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+def _init_worker(settings_module):
+    # Workers are spawned, not forked, so they need to find the settings themselves
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+
+def _workers():
+    return getattr(settings, 'PASSWORD_HASH_WORKERS', 0)
+
+
+def _pool():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            workers = _workers()
+            _slots = threading.BoundedSemaphore(getattr(settings, 'PASSWORD_HASH_MAX_PENDING', workers * 4))
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                # Forking a multi-threaded web worker can deadlock the child
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(settings.SETTINGS_MODULE,),
+            )
+        return _executor, _slots
+
+
+def _reset(broken):
+    global _executor
+    with _lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+def _run(func, *args):
+    if _workers() <= 0:
+        return func(*args)
+    executor, slots = _pool()
+    if not slots.acquire(timeout=getattr(settings, 'PASSWORD_HASH_WAIT', 2.0)):
+        raise PasswordHashingBusy('Too many password checks in progress')
+    try:
+        return executor.submit(func, *args).result()
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed): start a fresh pool next time, hash inline now
+        logger.exception('password hashing pool broke, restarting it')
+        _reset(executor)
+        return func(*args)
+    finally:
+        slots.release()
+
+
+def hash_password(password):
+    return _run(hashers.make_password, password)
+
+
+def verify_password(password, encoded):
+    """Return (is_correct, must_update) like django.contrib.auth.hashers.verify_password."""
+    return _run(hashers.verify_password, password, encoded)
+
+
+def check_user_password(user, password):
+    """Check a user's password in the pool, rehashing it when the hasher settings changed."""
+    is_correct, must_update = verify_password(password, user.password)
+    if is_correct and must_update:
+        user.password = hash_password(password)
+        user.save(update_fields=['password'])
+    return is_correct
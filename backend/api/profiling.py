@@ -0,0 +1,172 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+
+# Opt-in profiling of single requests. A request is profiled when it carries
+# `?profile=1` (or `?profile=sample`) from a staff user, or a signed
+# X-Profile-Token header created with `manage.py profile_token`.
+# Captures are written to PROFILE_DIR:
+#   <id>.prof    cProfile stats (open with snakeviz / pstats)
+#   <id>.folded  sampled stacks in folded format (flamegraph.pl / speedscope)
+#   <id>.json    request metadata, listed by /api/admin/profiles/
+
+TOKEN_SALT = 'api.profiling'
+CAPTURE_ID = re.compile(r'^[\w.-]+$')
+
+
+def profile_dir():
+    return str(getattr(settings, 'PROFILE_DIR', settings.BASE_DIR / 'profiles'))
+
+
+def make_token():
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign('profile')
+
+
+def valid_token(token):
+    max_age = getattr(settings, 'PROFILE_TOKEN_MAX_AGE', 3600)
+    try:
+        return signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=max_age) == 'profile'
+    except signing.BadSignature:
+        return False
+
+
+class SamplingProfiler:
+    """Sample the calling thread's stack from a background thread."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def run_profiled(mode, func):
+    """Call func() under the requested profiler; return (result, profiler)."""
+    if mode == 'sample':
+        profiler = SamplingProfiler(getattr(settings, 'PROFILE_SAMPLE_INTERVAL', 0.005))
+        profiler.start()
+        try:
+            return func(), profiler
+        finally:
+            profiler.stop()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return func(), profiler
+    finally:
+        profiler.disable()
+
+
+async def run_profiled_async(mode, func):
+    """Await func() under the requested profiler; return (result, profiler).
+
+    Profiles the event loop thread, so other requests the worker serves
+    concurrently show up in the capture as well.
+    """
+    if mode == 'sample':
+        profiler = SamplingProfiler(getattr(settings, 'PROFILE_SAMPLE_INTERVAL', 0.005))
+        profiler.start()
+        try:
+            return await func(), profiler
+        finally:
+            profiler.stop()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return await func(), profiler
+    finally:
+        profiler.disable()
+
+
+def save_capture(profiler, meta):
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    view = re.sub(r'[^\w]+', '-', meta.get('view') or 'unmatched').strip('-')
+    capture_id = f'{time.strftime("%Y%m%d-%H%M%S")}-{int(time.time() * 1000) % 1000:03d}-{view}-{os.getpid()}'
+
+    if isinstance(profiler, SamplingProfiler):
+        meta['file'] = f'{capture_id}.folded'
+        with open(os.path.join(directory, meta['file']), 'w') as f:
+            f.write(profiler.folded())
+    else:
+        meta['file'] = f'{capture_id}.prof'
+        profiler.dump_stats(os.path.join(directory, meta['file']))
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(25)
+        meta['summary'] = summary.getvalue()
+
+    meta['id'] = capture_id
+    with open(os.path.join(directory, f'{capture_id}.json'), 'w') as f:
+        json.dump(meta, f)
+    prune_captures(directory)
+    return capture_id
+
+
+def prune_captures(directory):
+    keep = getattr(settings, 'PROFILE_KEEP', 50)
+    captures = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    for name in captures[:-keep] if keep else []:
+        capture_id = name[:-len('.json')]
+        for suffix in ('.json', '.prof', '.folded'):
+            try:
+                os.remove(os.path.join(directory, capture_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_captures():
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    captures = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        meta.pop('summary', None)
+        captures.append(meta)
+    return captures
+
+
+def capture_path(capture_id, kind):
+    """Path of a capture file, or None if it does not exist (kind: json, prof or folded)."""
+    if not CAPTURE_ID.match(capture_id) or kind not in ('json', 'prof', 'folded'):
+        return None
+    path = os.path.join(profile_dir(), f'{capture_id}.{kind}')
+    return path if os.path.isfile(path) else None
@@ -0,0 +1,145 @@
+from itertools import chain
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Q
+
+from .models import MangoCategory, Order, OrderItem, ArchivedOrder, ArchivedOrderItem, MangoRecommendation
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_TOP_N = 5
+# Orders are turned into a dense order x mango matrix in chunks of this size.
+CHUNK_SIZE = 50000
+# Orders marked as folded in per UPDATE.
+MARK_BATCH_SIZE = 10000
+
+
+def _co_occurrence(order_ids, mango_ids, index_of, size):
+    # One-hot order x mango matrix; B.T @ B counts, for every pair of mangoes,
+    # the number of orders that contain both (diagonal = orders per mango).
+    counts = np.zeros((size, size), dtype=np.int64)
+    if not order_ids:
+        return counts
+
+    rows = np.unique(np.asarray(order_ids), return_inverse=True)[1]
+    cols = np.asarray([index_of[mango_id] for mango_id in mango_ids])
+    n_orders = int(rows.max()) + 1
+    for start in range(0, n_orders, CHUNK_SIZE):
+        mask = (rows >= start) & (rows < start + CHUNK_SIZE)
+        basket = np.zeros((min(CHUNK_SIZE, n_orders - start), size), dtype=np.int64)
+        basket[rows[mask] - start, cols[mask]] = 1
+        counts += basket.T @ basket
+    return counts
+
+
+def _top_neighbours(counts, mangoes, top_n):
+    # Cosine similarity: co-purchases normalised by how popular both mangoes are.
+    totals = np.diag(counts).astype(np.float64)
+    norm = np.sqrt(np.outer(totals, totals))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(norm > 0, counts / norm, 0.0)
+    np.fill_diagonal(scores, 0.0)
+
+    ranked = np.argsort(-scores, axis=1, kind='stable')[:, :top_n]
+    neighbours = []
+    for i, row in enumerate(ranked):
+        neighbours.append([
+            {
+                'mango_id': mangoes[j].id,
+                'name': mangoes[j].name,
+                'score': round(float(scores[i, j]), 4),
+                'orders_together': int(counts[i, j]),
+            }
+            for j in row if j != i and counts[i, j] > 0
+        ])
+    return neighbours
+
+
+def _baskets(condition, index_of):
+    # (order_id, mango_id) pairs of live and archived orders matching condition;
+    # archived orders (api/archive.py) are still purchase history
+    items = [
+        item_model.objects.filter(condition)
+        .values_list('order_id', 'mango_id')
+        .distinct()
+        .order_by('order_id')
+        for item_model in (OrderItem, ArchivedOrderItem)
+    ]
+    order_ids, mango_ids = [], []
+    for order_id, mango_id in chain.from_iterable(queryset.iterator(chunk_size=10000) for queryset in items):
+        if mango_id in index_of:
+            order_ids.append(order_id)
+            mango_ids.append(mango_id)
+    return order_ids, mango_ids
+
+
+def _flag(order_ids, value):
+    # Archived orders keep their ids; flag both tables in case one was archived mid-build
+    for start in range(0, len(order_ids), MARK_BATCH_SIZE):
+        batch = order_ids[start:start + MARK_BATCH_SIZE]
+        for order_model in (Order, ArchivedOrder):
+            order_model.objects.filter(id__in=batch).update(in_recommendations=value)
+
+
+def build_recommendations(full=False, top_n=DEFAULT_TOP_N):
+    """Fold orders not yet counted into the co-occurrence matrix and store the
+    top-N neighbours for every mango. Returns the number of new orders.
+
+    Counted orders are flagged (in_recommendations) rather than tracked by a
+    highest-id watermark, so an order that commits after a higher id has
+    already been built is still picked up by the next run. Counted orders
+    that have been cancelled since are taken back out and unflagged, so an
+    order cancelled and later reinstated is counted again."""
+    if np is None:
+        raise ImproperlyConfigured('numpy is required to build recommendations (pip install numpy).')
+
+    mangoes = list(MangoCategory.objects.order_by('id').only('id', 'name'))
+    index_of = {mango.id: i for i, mango in enumerate(mangoes)}
+    size = len(mangoes)
+
+    existing = {} if full else MangoRecommendation.objects.in_bulk()
+    cancelled = Q(order__status__iexact='cancelled')
+    pending = ~cancelled if full else Q(order__in_recommendations=False) & ~cancelled
+
+    order_ids, mango_ids = _baskets(pending, index_of)
+    counts = _co_occurrence(order_ids, mango_ids, index_of, size)
+    # A full build recounts from scratch, so withdrawn orders only need unflagging
+    withdrawn_ids, withdrawn_mango_ids = _baskets(Q(order__in_recommendations=True) & cancelled, index_of)
+    if not full:
+        counts -= _co_occurrence(withdrawn_ids, withdrawn_mango_ids, index_of, size)
+    # Add the counts stored by previous runs so only new orders are scanned.
+    for mango_id, rec in existing.items():
+        if mango_id not in index_of:
+            continue
+        i = index_of[mango_id]
+        counts[i, i] += rec.order_count
+        for other_id, together in rec.co_counts.items():
+            j = index_of.get(int(other_id))
+            if j is not None:
+                counts[i, j] += together
+    np.maximum(counts, 0, out=counts)
+
+    neighbours = _top_neighbours(counts, mangoes, top_n)
+
+    rows = []
+    for i, mango in enumerate(mangoes):
+        nonzero = np.nonzero(counts[i])[0]
+        rows.append(MangoRecommendation(
+            mango_id=mango.id,
+            order_count=int(counts[i, i]),
+            co_counts={str(mangoes[j].id): int(counts[i, j]) for j in nonzero if j != i},
+            neighbours=neighbours[i],
+        ))
+
+    new_orders = sorted(set(order_ids))
+    with transaction.atomic():
+        MangoRecommendation.objects.all().delete()
+        MangoRecommendation.objects.bulk_create(rows)
+        _flag(new_orders, True)
+        _flag(sorted(set(withdrawn_ids)), False)
+
+    return len(new_orders)
@@ -0,0 +1,120 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import MangoCategory, StockReservation
+from .signals import catalog_updated, reservations_changed
+
+# Time-limited stock reservations for flash sales.
+# When STOCK_RESERVATIONS_ENABLED is on, putting a mango in a cart holds that
+# many kg for STOCK_RESERVATION_MINUTES. Every change locks the mango row
+# (SELECT ... FOR UPDATE), so concurrent carts for the same mango are checked
+# one at a time and the sum of live reservations never exceeds stock_quantity.
+# Checkout turns the reservation into a stock decrement; expired reservations
+# stop counting immediately and are deleted by `manage.py release_reservations`.
+
+
+class InsufficientStock(Exception):
+    def __init__(self, mango, available):
+        self.mango = mango
+        self.available = max(available, 0)
+        super().__init__(f'Only {self.available} kg of {mango.name} available')
+
+
+def enabled():
+    return getattr(settings, 'STOCK_RESERVATIONS_ENABLED', False)
+
+
+def expiry_time(now=None):
+    minutes = getattr(settings, 'STOCK_RESERVATION_MINUTES', 15)
+    return (now or timezone.now()) + timedelta(minutes=minutes)
+
+
+def active(now=None):
+    return StockReservation.objects.filter(expires_at__gt=now or timezone.now())
+
+
+def reserved_quantity(mango_id, exclude_user=None, now=None):
+    reservations = active(now).filter(mango_id=mango_id)
+    if exclude_user is not None:
+        reservations = reservations.exclude(user=exclude_user)
+    return reservations.aggregate(total=Sum('quantity'))['total'] or 0
+
+
+def availability(mango, user=None):
+    now = timezone.now()
+    reserved = reserved_quantity(mango.pk, now=now)
+    held = 0
+    if user is not None and user.is_authenticated:
+        held = active(now).filter(mango=mango, user=user).values_list('quantity', flat=True).first() or 0
+    return {
+        'mango_id': mango.pk,
+        'stock_quantity': mango.stock_quantity,
+        'reserved_quantity': reserved,
+        'available_quantity': max(mango.stock_quantity - reserved, 0),
+        'your_reservation': held,
+    }
+
+
+def changed(mango_ids=None):
+    mango_ids = list(mango_ids) if mango_ids is not None else None
+    transaction.on_commit(lambda: reservations_changed.send(sender=StockReservation, mango_ids=mango_ids))
+
+
+def reserve(user, mango_id, quantity):
+    """Hold `quantity` kg of a mango for `user`, replacing any earlier hold.
+
+    Raises InsufficientStock if other users' live reservations leave too little.
+    """
+    with transaction.atomic():
+        mango = MangoCategory.objects.select_for_update().get(pk=mango_id)
+        now = timezone.now()
+        available = mango.stock_quantity - reserved_quantity(mango.pk, exclude_user=user, now=now)
+        if quantity > available:
+            raise InsufficientStock(mango, available)
+        reservation, _ = StockReservation.objects.update_or_create(
+            user=user, mango=mango,
+            defaults={'quantity': quantity, 'expires_at': expiry_time(now)},
+        )
+        changed([mango_id])
+    return reservation
+
+
+def release(user, mango_ids=None):
+    reservations = StockReservation.objects.filter(user=user)
+    if mango_ids is not None:
+        reservations = reservations.filter(mango_id__in=mango_ids)
+    if reservations.delete()[0]:
+        changed(mango_ids)
+
+
+def consume(user, quantities):
+    """Check out `quantities` ({mango_id: kg}) against the user's reservations.
+
+    Must run inside the checkout transaction. Stock is re-checked under lock
+    (the user's own hold may have expired meanwhile), then decremented and the
+    reservations removed.
+    """
+    # Lock in primary key order so two checkouts can never deadlock
+    mangoes = MangoCategory.objects.select_for_update().filter(pk__in=quantities).order_by('pk')
+    now = timezone.now()
+    for mango in mangoes:
+        available = mango.stock_quantity - reserved_quantity(mango.pk, exclude_user=user, now=now)
+        if quantities[mango.pk] > available:
+            raise InsufficientStock(mango, available)
+    for mango_id, quantity in quantities.items():
+        MangoCategory.objects.filter(pk=mango_id).update(stock_quantity=F('stock_quantity') - quantity)
+    release(user, list(quantities))
+    # Queryset updates skip post_save, so invalidate the cached catalog here
+    mango_ids = list(quantities)
+    transaction.on_commit(lambda: catalog_updated.send(sender=MangoCategory, mango_ids=mango_ids))
+
+
+def release_expired(now=None):
+    deleted, _ = StockReservation.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    if deleted:
+        changed()
+    return deleted
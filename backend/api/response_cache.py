@@ -0,0 +1,115 @@
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .compression import compress
+
+# Cache for public, rarely changing JSON payloads (catalog, review pages).
+# Each cache group has a version number; bumping it (see api/signals.py)
+# makes every cached payload in the group stale at once. Compressed variants
+# are stored next to the body the first time a client asks for them, so each
+# payload version is compressed once instead of once per request.
+
+
+def _version_key(group):
+    return f'payload-version:{group}'
+
+
+def group_version(group):
+    version = cache.get(_version_key(group))
+    if version is None:
+        cache.add(_version_key(group), 1, timeout=None)
+        version = cache.get(_version_key(group), 1)
+    return version
+
+
+def bump(*groups):
+    for group in groups:
+        try:
+            cache.incr(_version_key(group))
+        except ValueError:
+            cache.set(_version_key(group), 2, timeout=None)
+
+
+class CachedPayload:
+    """Compressed variants of a cached body; used by CompressionMiddleware."""
+
+    def __init__(self, key, body):
+        self.key = key
+        self.body = body
+
+    def compressed(self, encoding):
+        variant_key = f'{self.key}:{encoding}'
+        data = cache.get(variant_key)
+        if data is None:
+            data = compress(self.body, encoding)
+            cache.set(variant_key, data, getattr(settings, 'PAYLOAD_CACHE_TIMEOUT', 300))
+        return data
+
+
+def payload_key(request, groups):
+    versions = '.'.join(str(group_version(group)) for group in groups)
+    # Payloads hold absolute URLs (build_absolute_uri), so the host is part of the key
+    raw = f'{request.get_host()}|{request.get_full_path()}|{request.headers.get("Accept", "")}'
+    return f'payload:{"-".join(groups)}:{versions}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def cached_response(key):
+    hit = cache.get(key)
+    if hit is None:
+        return None
+    body, content_type = hit
+    response = HttpResponse(body, content_type=content_type)
+    # Same Vary as the DRF response it was cached from
+    patch_vary_headers(response, ['Accept'])
+    response.cached_payload = CachedPayload(key, body)
+    return response
+
+
+def store_response(key, response):
+    if response.status_code == 200 and not response.streaming:
+        if hasattr(response, 'render'):
+            response.render()
+        content_type = response.get('Content-Type', '')
+        if content_type.startswith('application/json'):
+            cache.set(key, (response.content, content_type), getattr(settings, 'PAYLOAD_CACHE_TIMEOUT', 300))
+            response.cached_payload = CachedPayload(key, response.content)
+    return response
+
+
+def cached_payload(*groups):
+    """Cache successful JSON GET responses of a view, invalidated by bumping any of `groups`.
+    Works on sync and async views (api/async_views.py)."""
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                key = await sync_to_async(payload_key)(request, groups)
+                response = await sync_to_async(cached_response)(key)
+                if response is None:
+                    response = await sync_to_async(store_response)(key, await view(request, *args, **kwargs))
+                return response
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            key = payload_key(request, groups)
+            response = cached_response(key)
+            if response is None:
+                response = store_response(key, view(request, *args, **kwargs))
+            return response
+
+        return wrapper
+
+    return decorator
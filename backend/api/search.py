@@ -0,0 +1,172 @@
+import difflib
+import html
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Upper
+from django.db.models.lookups import Exact
+
+from .models import MangoCategory, PHONE_COUNTRY_CODE, normalize_phone
+
+# Full-text search over mango names and descriptions.
+# PostgreSQL uses a GIN index on a weighted tsvector expression plus a pg_trgm
+# index on the name (so "himsagor" still finds "Himsagar"). SQLite uses an FTS5
+# table kept in sync by triggers. Both are created in migration 0005.
+
+SEARCH_CONFIG = 'english'
+MAX_RESULTS = 50
+
+# The database marks matches with control characters; the snippet is then
+# HTML-escaped and only those become <mark> tags (see _highlight), so markup
+# in a description is never passed through to the frontend.
+MARK_START = '\x02'
+MARK_STOP = '\x03'
+
+# Must stay identical to the indexed expression in migration 0005,
+# otherwise PostgreSQL will not use the GIN index.
+PG_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(m.name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(m.description, '')), 'B')"
+)
+
+PG_SEARCH_SQL = f"""
+    SELECT m.*,
+           ts_rank({PG_SEARCH_DOCUMENT}, q.query) + similarity(m.name, %s) AS rank,
+           ts_headline('english', coalesce(m.description, ''), q.query,
+                       'StartSel={MARK_START}, StopSel={MARK_STOP}, MaxFragments=2, MaxWords=20, MinWords=5') AS snippet
+    FROM api_mangocategory m, websearch_to_tsquery('english', %s) AS q(query)
+    WHERE {PG_SEARCH_DOCUMENT} @@ q.query OR m.name %% %s
+    ORDER BY rank DESC, m.id
+    LIMIT %s
+"""
+
+SQLITE_SEARCH_SQL = f"""
+    SELECT m.*,
+           -bm25(api_mangocategory_fts, 10.0, 1.0) AS rank,
+           snippet(api_mangocategory_fts, 1, '{MARK_START}', '{MARK_STOP}', '...', 12) AS snippet
+    FROM api_mangocategory_fts
+    JOIN api_mangocategory m ON m.id = api_mangocategory_fts.rowid
+    WHERE api_mangocategory_fts MATCH %s
+    ORDER BY rank DESC, m.id
+    LIMIT %s
+"""
+
+
+def _highlight(text):
+    return html.escape(text or '').replace(MARK_START, '<mark>').replace(MARK_STOP, '</mark>')
+
+
+def _fts5_query(query):
+    # Quote every term so user input can never be parsed as FTS5 syntax,
+    # and allow prefix matches while the user is still typing.
+    terms = re.findall(r'\w+', query)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _fuzzy_name_matches(query, limit):
+    # FTS5 has no fuzzy matching, so fall back to comparing against the
+    # variety names (the catalog is small enough to do this in Python).
+    names = dict(MangoCategory.objects.values_list('id', 'name'))
+    lowered = {mango_id: name.lower() for mango_id, name in names.items()}
+    scored = []
+    for mango_id, name in lowered.items():
+        score = difflib.SequenceMatcher(None, query.lower(), name).ratio()
+        if score >= 0.6:
+            scored.append((score, mango_id))
+    scored.sort(key=lambda pair: (-pair[0], pair[1]))
+    scored = scored[:limit]
+
+    mangoes = MangoCategory.objects.in_bulk([mango_id for _, mango_id in scored])
+    results = []
+    for score, mango_id in scored:
+        mango = mangoes[mango_id]
+        mango.rank = round(score, 4)
+        mango.snippet = mango.description[:120]
+        results.append(mango)
+    return results
+
+
+def search_mangoes(query, limit=20):
+    """Return ranked MangoCategory objects with `rank` and `snippet` (escaped HTML) attributes."""
+    query = (query or '').strip()
+    limit = max(1, min(int(limit), MAX_RESULTS))
+    if not query:
+        return []
+
+    if connection.vendor == 'postgresql':
+        results = list(MangoCategory.objects.raw(PG_SEARCH_SQL, [query, query, query, limit]))
+    elif connection.vendor == 'sqlite':
+        fts_query = _fts5_query(query)
+        results = []
+        if fts_query:
+            results = list(MangoCategory.objects.raw(SQLITE_SEARCH_SQL, [fts_query, limit]))
+        results = results or _fuzzy_name_matches(query, limit)
+    else:
+        # Other backends have no search index; plain substring match.
+        results = list(MangoCategory.objects.filter(name__icontains=query)[:limit])
+        for mango in results:
+            mango.rank = 1.0
+            mango.snippet = mango.description[:120]
+
+    for mango in results:
+        mango.snippet = _highlight(mango.snippet)
+    return results
+
+
+# Order search for support staff (GET /api/admin/order-search/ and the order admin).
+# Phone-like queries match the digits-only phone columns, anything else a part
+# of the shipping address. On PostgreSQL both are substring matches served by
+# the pg_trgm indexes from migration 0015, so they never scan the order table.
+# "#123" finds an order by id and an email address finds the customer's orders.
+
+MIN_ORDER_QUERY = 3  # shortest phone / address fragment a trigram index can serve
+PHONE_QUERY = re.compile(r'[\d\s()+./-]+')
+
+
+def phone_query_forms(query):
+    """Digit strings to look for in the normalised phone columns.
+
+    normalize_phone only strips the country code from complete numbers, so a
+    fragment such as '+880 1711' is converted here ('01711'). Without a '+' or
+    '00' prefix, '8801711' may just as well be part of a national number, so
+    both forms are searched."""
+    digits = normalize_phone(query)
+    if not digits.startswith(PHONE_COUNTRY_CODE):
+        return [digits]
+    national = digits[len(PHONE_COUNTRY_CODE):]
+    if not national.startswith('0'):
+        national = '0' + national
+    if query.startswith('+') or re.sub(r'\D', '', query).startswith('00'):
+        return [national]
+    return [digits, national]
+
+
+def order_search_filter(query):
+    """Q object for an order search query, or None when the query is too short to search."""
+    query = (query or '').strip()
+    if query.startswith('#') and query[1:].isdigit():
+        return Q(id=int(query[1:]))
+    if '@' in query:
+        return Q(user__email__iexact=query)
+    if PHONE_QUERY.fullmatch(query):
+        forms = [digits for digits in phone_query_forms(query) if len(digits) >= MIN_ORDER_QUERY]
+        if not forms:
+            return None
+        condition = Q()
+        for digits in forms:
+            condition |= Q(phone_digits__contains=digits) | Q(additional_phone_digits__contains=digits)
+        return condition
+    if len(query) < MIN_ORDER_QUERY:
+        return None
+    return Q(shipping_address__icontains=query)
+
+
+def user_search_filter(query, user_path='user'):
+    """Q object matching the user at user_path by exact username or, for an
+    email address, case-insensitively by email (auth_user_email_upper_idx)."""
+    query = (query or '').strip()
+    if '@' in query:
+        # Compared as UPPER(email), like EmailOrUsernameBackend
+        return Q(Exact(Upper(f'{user_path}__email'), query.upper()))
+    return Q(**{f'{user_path}__username': query})
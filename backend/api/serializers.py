@@ -1,12 +1,100 @@
+from django.contrib.auth.models import User
 from rest_framework import serializers
-from .models import MangoCategory, Cart, CartItem, Order, OrderItem, Payment, UserProfile, CategoryFeedback
+
+from .auth_backends import email_taken
+from .tracing import span
+from .models import MangoCategory, Cart, CartItem, Order, OrderItem, Payment, UserProfile, CategoryFeedback, ArchivedOrderItem
+
+
+# Sparse fieldsets and expansions
+# `?fields=id,status,items.id` keeps only the listed fields (dotted names reach
+# into nested serializers) and `?expand=items` adds optional fields listed in
+# Meta.expandable_fields. Views use wants() to skip joins for pruned fields.
+
+def field_options(request):
+    def parse(name):
+        # DRF requests have query_params; plain Django requests (async views) only GET
+        value = getattr(request, 'query_params', request.GET).get(name) if request is not None else None
+        return {part.strip() for part in value.split(',') if part.strip()} if value else None
+    return {'fields': parse('fields'), 'expand': parse('expand') or set()}
+
+
+def nested_options(options, name):
+    prefix = name + '.'
+    fields = options.get('fields')
+    nested_fields = {f[len(prefix):] for f in fields if f.startswith(prefix)} if fields else set()
+    return {
+        'fields': nested_fields or None,
+        'expand': {e[len(prefix):] for e in options.get('expand', ()) if e.startswith(prefix)},
+    }
+
+
+def wants(options, name, expandable=False):
+    fields = options.get('fields')
+    if expandable and name not in options.get('expand', ()):
+        return bool(fields) and name in {f.split('.')[0] for f in fields}
+    return not fields or name in {f.split('.')[0] for f in fields}
+
+
+# Top-level serializer calls show up as spans in request traces (api/tracing.py)
+class TracedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with span('serialize', serializer=f'{type(self.child).__name__}(many=True)'):
+            return super().data
+
+
+class DynamicFieldsMixin:
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        meta = getattr(cls, 'Meta', None)
+        if meta is not None and not hasattr(meta, 'list_serializer_class'):
+            meta.list_serializer_class = TracedListSerializer
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.apply_field_options({'fields': fields, 'expand': expand or set()})
+
+    @property
+    def data(self):
+        with span('serialize', serializer=type(self).__name__):
+            return super().data
+
+    def apply_field_options(self, options):
+        for name, (serializer_class, field_kwargs) in getattr(self.Meta, 'expandable_fields', {}).items():
+            if wants(options, name, expandable=True):
+                self.fields[name] = serializer_class(read_only=True, **field_kwargs)
+
+        if options['fields']:
+            keep = {f.split('.')[0] for f in options['fields']}
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+
+        for name, field in self.fields.items():
+            child = field.child if isinstance(field, serializers.ListSerializer) else field
+            sub_options = nested_options(options, name)
+            if isinstance(child, DynamicFieldsMixin) and (sub_options['fields'] or sub_options['expand']):
+                child.apply_field_options(sub_options)
 
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserProfile
         fields = ['image_url', 'phone_number', 'additional_phone', 'billing_address', 'shipping_address']
 
-class MangoCategorySerializer(serializers.ModelSerializer):
+# Email change from the profile page; emails are unique regardless of case
+class UserEmailSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['email']
+
+    def validate_email(self, value):
+        value = User.objects.normalize_email(value)
+        if value and email_taken(value, exclude_user=self.instance):
+            raise serializers.ValidationError('Email already registered.')
+        return value
+
+class MangoCategorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     image = serializers.ImageField(use_url=True)
     average_rating = serializers.SerializerMethodField()
     total_ratings = serializers.SerializerMethodField()
@@ -16,20 +104,34 @@ class MangoCategorySerializer(serializers.ModelSerializer):
         fields = '__all__'
     
     def get_average_rating(self, obj):
+        # Use the annotation from MangoCategoryViewSet.get_queryset when present
+        if hasattr(obj, 'rating_average'):
+            return round(obj.rating_average, 1) if obj.rating_average else 0
         feedbacks = obj.feedbacks.all()
         if feedbacks:
             return round(sum(f.rating for f in feedbacks) / len(feedbacks), 1)
         return 0
     
     def get_total_ratings(self, obj):
+        if hasattr(obj, 'rating_count'):
+            return obj.rating_count
         return obj.feedbacks.count()
 
+class MangoSearchResultSerializer(serializers.ModelSerializer):
+    image = serializers.ImageField(use_url=True)
+    rank = serializers.FloatField(read_only=True)
+    snippet = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = MangoCategory
+        fields = ['id', 'name', 'description', 'price', 'stock_quantity', 'image', 'rank', 'snippet']
+
 class CartSerializer(serializers.ModelSerializer):
     class Meta:
         model = Cart
         fields = '__all__'
 
-class CategoryFeedbackSerializer(serializers.ModelSerializer):
+class CategoryFeedbackSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.username', read_only=True)
     mango_name = serializers.CharField(source='mango_category.name', read_only=True)
     
@@ -38,14 +140,14 @@ class CategoryFeedbackSerializer(serializers.ModelSerializer):
         fields = ['id', 'order_item', 'user', 'user_name', 'mango_category', 'mango_name', 'rating', 'comment', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at', 'user']
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     mango_category = MangoCategorySerializer(source='mango', read_only=True)
     
     class Meta:
         model = CartItem
         fields = ['id', 'mango_category', 'quantity']
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     mango_category = serializers.CharField(source='mango.name', read_only=True)
     mango_name = serializers.CharField(source='mango.name', read_only=True)
     mango_id = serializers.IntegerField(source='mango.id', read_only=True)
@@ -63,20 +165,39 @@ class OrderItemSerializer(serializers.ModelSerializer):
         return obj.quantity * obj.price
     
     def get_can_give_feedback(self, obj):
-        # Check if order is delivered
-        return obj.order.status.lower() == 'delivered'
+        # Check if order is delivered (archived orders are read-only)
+        return obj.order.status.lower() == 'delivered' and not isinstance(obj, ArchivedOrderItem)
+
+
+# An item waiting for a review (see get_pending_feedback)
+class PendingFeedbackItemSerializer(serializers.ModelSerializer):
+    order_item_id = serializers.IntegerField(source='id', read_only=True)
+    order_id = serializers.IntegerField(read_only=True)
+    order_date = serializers.DateTimeField(source='order.order_date', read_only=True)
+    mango_id = serializers.IntegerField(read_only=True)
+    mango_name = serializers.CharField(source='mango.name', read_only=True)
+    mango_image = serializers.ImageField(source='mango.image', read_only=True, use_url=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ['order_item_id', 'order_id', 'order_date', 'mango_id', 'mango_name', 'mango_image', 'quantity']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.username', read_only=True)
     user_email = serializers.CharField(source='user.email', read_only=True)
     
     class Meta:
         model = Order
         fields = ['id', 'user', 'user_name', 'user_email', 'total_amount', 'order_date', 'status', 
-                 'billing_address', 'shipping_address', 'phone_number', 'additional_phone', 'payment_method']
+                 'billing_address', 'shipping_address', 'phone_number', 'additional_phone', 'payment_method',
+                 'item_count', 'total_kg', 'items_preview']
+        read_only_fields = ['item_count', 'total_kg', 'items_preview']
+        expandable_fields = {
+            'items': (OrderItemSerializer, {'source': 'orderitem_set', 'many': True}),
+        }
 
-class OrderWithItemsSerializer(serializers.ModelSerializer):
+class OrderWithItemsSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.username', read_only=True)
     user_email = serializers.CharField(source='user.email', read_only=True)
     items = OrderItemSerializer(source='orderitem_set', many=True, read_only=True)
@@ -84,7 +205,9 @@ class OrderWithItemsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['id', 'user', 'user_name', 'user_email', 'total_amount', 'order_date', 'status', 
-                 'billing_address', 'shipping_address', 'phone_number', 'additional_phone', 'payment_method', 'items']
+                 'billing_address', 'shipping_address', 'phone_number', 'additional_phone', 'payment_method',
+                 'item_count', 'total_kg', 'items_preview', 'items']
+        read_only_fields = ['item_count', 'total_kg', 'items_preview']
 
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,55 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from .models import MangoCategory, CategoryFeedback, Order
+from .analytics import record_order_deleted
+from .response_cache import bump
+from .slow_queries import install as install_slow_query_log
+from .db_connections import count_connect
+from .metrics import install as install_query_counter
+from .tracing import install as install_query_tracer
+
+# Sent whenever catalog data (names, prices, stock) changes, so anything
+# caching catalog data can invalidate it. Receivers get `mango_ids`, the
+# list of affected MangoCategory ids. Bulk operations send it once.
+catalog_updated = Signal()
+
+# Sent after stock reservations are created, changed or released (see
+# api/reservations.py). Receivers get `mango_ids` (None for "any").
+reservations_changed = Signal()
+
+
+# Invalidation waits for the writer's transaction to commit (it runs right away
+# outside of one): a request served in between would otherwise cache the old
+# data under the new version.
+
+@receiver([post_save, post_delete], sender=MangoCategory)
+def mango_changed(sender, instance, **kwargs):
+    mango_ids = [instance.id]
+    transaction.on_commit(lambda: catalog_updated.send(sender=MangoCategory, mango_ids=mango_ids))
+
+
+# Cached catalog payloads include ratings, so feedback changes invalidate both groups
+@receiver(catalog_updated)
+def invalidate_catalog_payloads(sender, **kwargs):
+    transaction.on_commit(lambda: bump('catalog'))
+
+
+@receiver([post_save, post_delete], sender=CategoryFeedback)
+def feedback_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump('catalog', 'feedback'))
+
+
+# pre_delete, while the order's items can still be read. Archiving deletes
+# orders inside analytics.rollups_unchanged(), which makes this a no-op.
+@receiver(pre_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    record_order_deleted(instance)
+
+
+connection_created.connect(install_slow_query_log, dispatch_uid='api.slow_query_log')
+connection_created.connect(count_connect, dispatch_uid='api.count_connect')
+connection_created.connect(install_query_counter, dispatch_uid='api.query_counter')
+connection_created.connect(install_query_tracer, dispatch_uid='api.query_tracer')
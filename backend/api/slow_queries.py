@@ -0,0 +1,187 @@
+import hashlib
+import logging
+import queue
+import re
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+logger = logging.getLogger('api.slow_queries')
+
+# Slow-query log. When SLOW_QUERY_MS is set, every database connection gets
+# an execute wrapper that times each statement. Statements over the threshold
+# are handed to a background thread, which logs them, aggregates them into
+# SlowQuery rows by fingerprint and captures an EXPLAIN plan for SELECTs,
+# so the request itself only pays for a timer and a queue put.
+
+# Request being handled (set by SlowQueryMiddleware); slow queries are
+# attributed to its resolved view
+current_request = ContextVar('current_request', default=None)
+
+_queue = queue.Queue(maxsize=1000)
+_worker = None
+_worker_lock = threading.Lock()
+_in_worker = threading.local()
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)')
+_SPACE = re.compile(r'\s+')
+# Transaction control is never interesting on its own
+_CONTROL_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+
+def normalize(sql):
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql.replace('%s', '?'))
+    return _SPACE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.md5(normalized_sql.encode()).hexdigest()
+
+
+def redact(params):
+    # Keep ids and flags (useful for reproducing a plan), hide everything else
+    redacted = []
+    for value in params or ():
+        if value is None or isinstance(value, (bool, int)):
+            redacted.append(value)
+        else:
+            redacted.append(f'<{type(value).__name__}>')
+    return redacted
+
+
+def current_view():
+    match = getattr(current_request.get(), 'resolver_match', None)
+    return match.view_name if match else ''
+
+
+class SlowQueryWrapper:
+    def __init__(self, alias):
+        self.alias = alias
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_in_worker, 'active', False) or sql.startswith(_CONTROL_STATEMENTS):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if elapsed_ms >= settings.SLOW_QUERY_MS:
+                enqueue({
+                    'alias': self.alias,
+                    'sql': sql,
+                    'params': None if many else params,
+                    'ms': elapsed_ms,
+                    'view': current_view(),
+                })
+
+
+def install(connection, **kwargs):
+    # connection_created receiver: hook every new connection (requests and commands)
+    if getattr(settings, 'SLOW_QUERY_MS', None) is None:
+        return
+    if not any(isinstance(wrapper, SlowQueryWrapper) for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.append(SlowQueryWrapper(connection.alias))
+
+
+def enqueue(entry):
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = threading.Thread(target=_run, name='slow-query-log', daemon=True)
+                _worker.start()
+    try:
+        _queue.put_nowait(entry)
+    except queue.Full:
+        pass
+
+
+def _run():
+    _in_worker.active = True
+    explained = {}
+    while True:
+        entry = _queue.get()
+        try:
+            record(entry, explained)
+        except Exception:
+            logger.exception('Could not record slow query')
+        finally:
+            _queue.task_done()
+            if _queue.empty():
+                close_old_connections()
+
+
+_PLACEHOLDER = re.compile(r'%([s%])')
+
+
+def _numbered_placeholders(sql):
+    # Django's %s placeholders as PostgreSQL's $1, $2, ... (and %% back to %)
+    numbers = iter(range(1, sql.count('%s') + 1))
+    return _PLACEHOLDER.sub(lambda m: f'${next(numbers)}' if m.group(1) == 's' else '%', sql)
+
+
+def explain(alias, sql, params):
+    """EXPLAIN a statement without its parameter values ending up in the plan.
+
+    PostgreSQL 16+ plans the statement with its placeholders (GENERIC_PLAN).
+    Elsewhere it is explained with the values it ran with, and string literals
+    are scrubbed from the plan, as normalize() does for the SQL."""
+    connection = connections[alias]
+    if connection.vendor == 'postgresql' and connection.features.is_postgresql_16:
+        sql, params = f'{connection.ops.explain_query_prefix(generic_plan=True)} {_numbered_placeholders(sql)}', None
+    else:
+        sql = f'{connection.ops.explain_query_prefix()} {sql}'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        plan = '\n'.join(' | '.join(str(col) for col in row) for row in cursor.fetchall())
+    return _STRING.sub("'?'", plan)
+
+
+def record(entry, explained):
+    from .models import SlowQuery
+
+    normalized = normalize(entry['sql'])
+    key = fingerprint(normalized)
+    params = redact(entry['params'])
+    logger.warning('slow query %.1f ms [%s] view=%s sql=%s params=%s',
+                   entry['ms'], key[:12], entry['view'] or '-', normalized, params)
+
+    SlowQuery.objects.get_or_create(fingerprint=key, defaults={'sql': normalized})
+    SlowQuery.objects.filter(fingerprint=key).update(
+        count=F('count') + 1,
+        total_ms=F('total_ms') + entry['ms'],
+        max_ms=Greatest('max_ms', entry['ms']),
+        view=entry['view'],
+        last_params=params,
+        last_seen=timezone.now(),
+    )
+
+    # Re-explain a statement at most once per SLOW_QUERY_EXPLAIN_INTERVAL seconds
+    interval = getattr(settings, 'SLOW_QUERY_EXPLAIN_INTERVAL', 3600)
+    if (getattr(settings, 'SLOW_QUERY_EXPLAIN', True) and entry['params'] is not None
+            and normalized.upper().startswith(('SELECT', 'WITH'))
+            and time.monotonic() - explained.get(key, -interval) >= interval):
+        explained[key] = time.monotonic()
+        try:
+            plan = explain(entry['alias'], entry['sql'], entry['params'])
+        except Exception as e:
+            plan = f'EXPLAIN failed: {e}'
+        SlowQuery.objects.filter(fingerprint=key).update(plan=plan)
+
+
+def flush(timeout=5):
+    """Wait for queued slow queries to be recorded (used by the report command and tests)."""
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
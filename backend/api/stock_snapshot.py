@@ -0,0 +1,91 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Sum
+from django.dispatch import receiver
+
+from .models import MangoCategory
+from .reservations import active, enabled
+from .signals import catalog_updated, reservations_changed
+
+# In-memory stock levels for the inventory badge endpoint (get_stock_levels).
+# Each process keeps one snapshot of every mango's stock, live reservations and
+# available kg, built with two queries and reused until it is
+# STOCK_SNAPSHOT_MAX_AGE seconds old. Stock and reservation changes made by
+# this process mark it stale right away; other processes pick them up when
+# their snapshot expires. Versions are hashes of the returned levels, so every
+# process computes the same version (and ETag) for the same data.
+
+
+class Snapshot:
+    def __init__(self, levels):
+        self.levels = levels
+        self.built_at = time.monotonic()
+        self.version = version_of(levels.values())
+
+
+def version_of(levels):
+    digest = hashlib.md5()
+    for level in levels:
+        digest.update(f'{level["mango_id"]}:{level["stock_quantity"]}:{level["reserved_quantity"]};'.encode())
+    return digest.hexdigest()[:16]
+
+
+def build():
+    reserved = {}
+    if enabled():
+        reserved = dict(active().values('mango_id').annotate(total=Sum('quantity')).values_list('mango_id', 'total'))
+    levels = {}
+    for mango_id, stock in MangoCategory.objects.order_by('id').values_list('id', 'stock_quantity'):
+        held = reserved.get(mango_id, 0)
+        levels[mango_id] = {
+            'mango_id': mango_id,
+            'stock_quantity': stock,
+            'reserved_quantity': held,
+            'available_quantity': max(stock - held, 0),
+        }
+    return Snapshot(levels)
+
+
+_snapshot = None
+_stale = False
+_lock = threading.Lock()
+
+
+def current():
+    global _snapshot, _stale
+    snapshot = _snapshot
+    max_age = getattr(settings, 'STOCK_SNAPSHOT_MAX_AGE', 2.0)
+    if snapshot is not None and not _stale and time.monotonic() - snapshot.built_at < max_age:
+        return snapshot
+    # One thread rebuilds; the others keep serving the previous snapshot meanwhile
+    if not _lock.acquire(blocking=snapshot is None):
+        return snapshot
+    try:
+        if _snapshot is snapshot:
+            _stale = False
+            _snapshot = build()
+        return _snapshot
+    finally:
+        _lock.release()
+
+
+def invalidate():
+    global _stale
+    _stale = True
+
+
+def levels(mango_ids=None):
+    """(version, levels) for the given mango ids (unknown ids are left out), or for every mango."""
+    snapshot = current()
+    if mango_ids is None:
+        return snapshot.version, list(snapshot.levels.values())
+    found = [snapshot.levels[mango_id] for mango_id in sorted(set(mango_ids)) if mango_id in snapshot.levels]
+    return version_of(found), found
+
+
+@receiver([catalog_updated, reservations_changed], dispatch_uid='api.stock_snapshot')
+def stock_changed(sender, **kwargs):
+    invalidate()
@@ -1,3 +1,244 @@
-from django.test import TestCase
+import re
+import threading
+from datetime import timedelta
 
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.test import APIClient
 
+from .auth_backends import EmailOrUsernameBackend
+from .models import MangoCategory, CartItem, Order, Payment, CategoryFeedback, StockReservation
+from .reservations import InsufficientStock, active, release_expired, reserve
+
+
+class HotQueryPlanTests(TestCase):
+    """The queries hot views and the login backend actually run must be answered
+    from their indexes, not a sequential scan (indexes from migration 0010 on).
+    Queries are captured while the real endpoint runs, then explained."""
+
+    USERS = 100
+    ORDERS = 5000
+    MANGOES = 20
+    FEEDBACKS = 4000
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        users = User.objects.bulk_create([
+            User(username=f'user{i}', email=f'user{i}@example.com') for i in range(cls.USERS)
+        ])
+        mangoes = MangoCategory.objects.bulk_create([
+            MangoCategory(name=f'Mango {i}', price=100, stock_quantity=10, image='mango_images/x.jpg')
+            for i in range(cls.MANGOES)
+        ])
+        orders = Order.objects.bulk_create([
+            Order(user=users[i % cls.USERS], total_amount=100, status='Pending' if i % 50 == 0 else 'Delivered')
+            for i in range(cls.ORDERS)
+        ], batch_size=1000)
+        # order_date is auto_now_add; spread it out so date ordering is meaningful
+        for i, order in enumerate(orders):
+            order.order_date = now - timedelta(minutes=i)
+        Order.objects.bulk_update(orders, ['order_date'], batch_size=1000)
+        Payment.objects.bulk_create([
+            Payment(order=order, payment_method='Cash on Delivery',
+                    payment_status='Pending' if i % 100 == 0 else 'Completed')
+            for i, order in enumerate(orders)
+        ], batch_size=1000)
+        CategoryFeedback.objects.bulk_create([
+            CategoryFeedback(user=users[i % cls.USERS], mango_category=mangoes[i % cls.MANGOES], rating=5)
+            for i in range(cls.FEEDBACKS)
+        ], batch_size=1000)
+        cls.user_id = users[0].id
+        cls.mango_id = mangoes[0].id
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        # Cached payloads would answer without running the view's queries
+        for cache in caches.all():
+            cache.clear()
+        self.admin_client = Client()
+        self.admin_client.force_login(User.objects.create_superuser('plan-admin', 'plan-admin@example.com', 'pw'))
+
+    def api(self, user=None):
+        client = APIClient()
+        client.force_authenticate(user or User.objects.get(id=self.user_id))
+        return client
+
+    def captured(self, table, run):
+        """SQL and params of the row-fetching queries on table that run() executes."""
+        queries = []
+
+        def capture(execute, sql, params, many, context):
+            queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            run()
+        return [(sql, params) for sql, params in queries
+                if sql.startswith('SELECT') and not sql.startswith('SELECT COUNT(')
+                and re.search(rf'(FROM|JOIN) "{table}"', sql)]
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return '\n'.join(' | '.join(str(col) for col in row) for row in cursor.fetchall())
+
+    def assertUsesIndex(self, table, run, index_name):
+        queries = self.captured(table, run)
+        self.assertTrue(queries, f'No query on {table}')
+        plans = '\n'.join(self.explain(sql, params) for sql, params in queries)
+        if connection.vendor == 'postgresql':
+            scans = re.findall(rf'Seq Scan on {table}\b', plans)
+        else:
+            # SQLite: "SCAN <table>" without "USING ... INDEX" reads the whole table
+            scans = [line for line in plans.splitlines() if re.search(rf'\bSCAN {table}\b', line) and 'USING' not in line]
+        self.assertFalse(scans, f'Sequential scan on {table}:\n{plans}')
+        self.assertIn(index_name, plans)
+
+    def test_user_orders(self):
+        client = self.api()
+        self.assertUsesIndex('api_order', lambda: client.get('/api/user-orders/'), 'order_user_date_idx')
+        self.assertUsesIndex('api_order', lambda: client.get('/api/user-orders-with-items/'), 'order_user_date_idx')
+
+    def test_latest_orders(self):
+        client = self.api(User.objects.get(username='plan-admin'))
+        self.assertUsesIndex('api_order', lambda: client.get('/api/admin-orders-details/'), 'order_date_idx')
+
+    def test_orders_by_status(self):
+        self.assertUsesIndex('api_order', lambda: self.admin_client.get('/admin/api/order/?status=pending'),
+                             'order_status_date_idx')
+
+    def test_pending_payments(self):
+        self.assertUsesIndex('api_payment', lambda: self.admin_client.get('/admin/api/payment/?payment_status=pending'),
+                             'payment_pending_idx')
+
+    def test_mango_feedbacks(self):
+        self.assertUsesIndex('api_categoryfeedback', lambda: self.client.get(f'/api/mango/{self.mango_id}/feedbacks/'),
+                             'feedback_mango_created_idx')
+
+    def test_mango_ratings(self):
+        # The catalog joins each mango's feedback for its average rating
+        self.assertUsesIndex('api_categoryfeedback', lambda: self.client.get(f'/api/mangoes/{self.mango_id}/'),
+                             'feedback_mango_created_idx')
+
+    def test_latest_feedbacks(self):
+        client = self.api(User.objects.get(username='plan-admin'))
+        self.assertUsesIndex('api_categoryfeedback', lambda: client.get('/api/admin/all-feedbacks/'), 'feedback_created_idx')
+
+    @override_settings(PASSWORD_HASH_WORKERS=0)
+    def test_login_by_email(self):
+        # Emails are compared as UPPER(email), the expression index
+        backend = EmailOrUsernameBackend()
+        self.assertUsesIndex('auth_user', lambda: backend.authenticate(None, email='User7@example.com', password='x'),
+                             'auth_user_email_upper_idx')
+        # Username or email: both sides of the OR are answered from an index
+        self.assertUsesIndex('auth_user', lambda: backend.authenticate(None, username='USER7@example.com', password='x'),
+                             'auth_user_email_upper_idx')
+
+
+@override_settings(STOCK_RESERVATIONS_ENABLED=True)
+class StockReservationTests(TestCase):
+    """Cart holds never add up to more than stock (see api/reservations.py)."""
+
+    def setUp(self):
+        self.mango = MangoCategory.objects.create(name='Himsagar', price=100, stock_quantity=10, image='mango_images/x.jpg')
+        self.alice = self.client_for('alice')
+        self.bob = self.client_for('bob')
+
+    def client_for(self, username):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username, f'{username}@example.com', 'pw'))
+        return client
+
+    def add(self, client, quantity):
+        return client.post('/api/add-to-cart/', {'mango_id': self.mango.id, 'quantity': quantity}, format='json')
+
+    def reserved(self):
+        return active().filter(mango=self.mango).aggregate(total=Sum('quantity'))['total'] or 0
+
+    def test_no_oversell(self):
+        self.assertEqual(self.add(self.alice, 6).status_code, 200)
+        response = self.add(self.bob, 5)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['available_quantity'], 4)
+        self.assertEqual(self.add(self.bob, 4).status_code, 200)
+        self.assertEqual(self.reserved(), 10)
+
+    def test_rejected_update_keeps_quantity_and_hold(self):
+        self.add(self.alice, 3)
+        self.add(self.bob, 6)
+        item = CartItem.objects.get(cart__user__username='alice')
+        self.assertEqual(self.alice.put(f'/api/cart-item/{item.id}/', {'quantity': 5}, format='json').status_code, 400)
+        self.assertEqual(self.alice.patch(f'/api/cart-items/{item.id}/', {'quantity': 5}, format='json').status_code, 400)
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 3)
+        self.assertEqual(StockReservation.objects.get(user__username='alice').quantity, 3)
+
+    def test_update_moves_hold_with_quantity(self):
+        self.add(self.alice, 3)
+        item = CartItem.objects.get(cart__user__username='alice')
+        self.assertEqual(self.alice.put(f'/api/cart-item/{item.id}/', {'quantity': 7}, format='json').status_code, 200)
+        self.assertEqual(self.alice.patch(f'/api/cart-items/{item.id}/', {'quantity': 8}, format='json').status_code, 200)
+        self.assertEqual(StockReservation.objects.get(user__username='alice').quantity, 8)
+        self.assertEqual(self.add(self.bob, 3).status_code, 400)
+
+    def test_removing_item_releases_hold(self):
+        self.add(self.alice, 6)
+        item = CartItem.objects.get(cart__user__username='alice')
+        self.assertEqual(self.alice.delete(f'/api/cart-item/{item.id}/delete/').status_code, 200)
+        self.assertEqual(self.reserved(), 0)
+        self.assertEqual(self.add(self.bob, 10).status_code, 200)
+
+    def test_expired_holds_stop_counting(self):
+        self.add(self.alice, 10)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.add(self.bob, 10).status_code, 200)
+        self.assertEqual(release_expired(), 1)
+        self.assertFalse(StockReservation.objects.filter(user__username='alice').exists())
+
+    def test_checkout_consumes_hold(self):
+        self.add(self.alice, 4)
+        response = self.alice.post('/api/create-order/', {
+            'phone_number': '01711234567', 'billing_address': 'x', 'shipping_address': 'y',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.mango.refresh_from_db()
+        self.assertEqual(self.mango.stock_quantity, 6)
+        self.assertEqual(self.reserved(), 0)
+        self.assertEqual(self.add(self.bob, 7).status_code, 400)
+        self.assertEqual(self.add(self.bob, 6).status_code, 200)
+
+
+@override_settings(STOCK_RESERVATIONS_ENABLED=True)
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentReservationTests(TransactionTestCase):
+    """Concurrent shoppers are checked one at a time under the mango row lock."""
+
+    def test_concurrent_reservations_never_oversell(self):
+        mango = MangoCategory.objects.create(name='Langra', price=100, stock_quantity=10, image='mango_images/x.jpg')
+        users = [User.objects.create_user(f'shopper{i}') for i in range(30)]
+        outcomes = []
+
+        def shop(user):
+            try:
+                reserve(user, mango.id, 1)
+                outcomes.append('reserved')
+            except InsufficientStock:
+                outcomes.append('sold_out')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=shop, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count('reserved'), 10)
+        self.assertEqual(outcomes.count('sold_out'), 20)
+        self.assertEqual(active().filter(mango=mango).aggregate(total=Sum('quantity'))['total'], 10)
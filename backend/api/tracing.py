@@ -0,0 +1,227 @@
+import json
+import logging
+import os
+import queue
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from .slow_queries import normalize
+
+logger = logging.getLogger('api.tracing')
+
+# Request tracing.
+# With TRACING_ENABLED every request gets a trace id: it is taken from an
+# incoming W3C `traceparent` header or generated, returned in X-Trace-Id and
+# added to log records (see TraceContextFilter). A TRACE_SAMPLE_RATE share of
+# requests (plus, with TRACE_HONOR_PARENT, those whose traceparent is marked
+# sampled) also record spans:
+# the request itself (TracingMiddleware), every database query, top-level
+# serializer calls and any `with span(...)` block. Finished spans go to a
+# background thread that writes them as Zipkin v2 JSON, one span per line, to
+# TRACE_DIR/spans-<pid>.jsonl ('file') or stderr ('console'). Span files are
+# rotated at TRACE_FILE_MAX_BYTES, keeping TRACE_FILE_BACKUPS older files
+# (spans-<pid>.1.jsonl, ...).
+# `manage.py traces` summarises the files and exports them for Zipkin / Jaeger.
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+SERVICE_NAME = 'mango-api'
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'tags', 'sampled', 'started', 'timestamp')
+
+    def __init__(self, trace_id, name, parent_id=None, kind=None, sampled=False, tags=None):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.tags = tags or {}
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.timestamp = int(time.time() * 1_000_000)
+
+    def child(self, name, **tags):
+        return Span(self.trace_id, name, parent_id=self.span_id, sampled=self.sampled, tags=tags)
+
+    def finish(self):
+        if self.sampled:
+            export(self.to_zipkin(int((time.perf_counter() - self.started) * 1_000_000)))
+
+    def to_zipkin(self, duration_us):
+        span = {
+            'traceId': self.trace_id,
+            'id': self.span_id,
+            'name': self.name,
+            'timestamp': self.timestamp,
+            'duration': max(duration_us, 1),
+            'localEndpoint': {'serviceName': SERVICE_NAME},
+            'tags': {key: str(value) for key, value in self.tags.items()},
+        }
+        if self.parent_id:
+            span['parentId'] = self.parent_id
+        if self.kind:
+            span['kind'] = self.kind
+        return span
+
+
+current_span = ContextVar('current_span', default=None)
+
+
+def enabled():
+    return getattr(settings, 'TRACING_ENABLED', False)
+
+
+def start_trace(name, traceparent=None, **tags):
+    """Root span for a request, continuing the caller's trace when a valid traceparent is given."""
+    match = TRACEPARENT.match(traceparent.strip().lower()) if traceparent else None
+    if match and match.group(1) != '0' * 32:
+        trace_id, parent_id, flags = match.groups()
+        # Off by default: any client could otherwise force full span recording
+        sampled = (getattr(settings, 'TRACE_HONOR_PARENT', False) and int(flags, 16) & 1 == 1) or _sample()
+    else:
+        trace_id, parent_id, sampled = secrets.token_hex(16), None, _sample()
+    return Span(trace_id, name, parent_id=parent_id, kind='SERVER', sampled=sampled, tags=tags)
+
+
+def _sample():
+    rate = getattr(settings, 'TRACE_SAMPLE_RATE', 0.0)
+    return rate > 0 and random.random() < rate
+
+
+@contextmanager
+def span(name, **tags):
+    """Time a block as a child of the current span. Free when the request is not sampled."""
+    parent = current_span.get()
+    if parent is None or not parent.sampled:
+        yield None
+        return
+    child = parent.child(name, **tags)
+    token = current_span.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.tags['error'] = type(e).__name__
+        raise
+    finally:
+        current_span.reset(token)
+        child.finish()
+
+
+class QueryTracer:
+    """Execute wrapper recording a span per SQL statement of a sampled request.
+
+    Installed on every connection (see install) rather than per request, since
+    under ASGI the ORM runs in sync_to_async threads with their own connections;
+    current_span follows the request into them."""
+
+    def __call__(self, execute, sql, params, many, context):
+        parent = current_span.get()
+        if parent is None or not parent.sampled:
+            return execute(sql, params, many, context)
+        with span('db.query', **{'db.system': context['connection'].vendor,
+                                 'db.statement': normalize(sql), 'db.many': many}):
+            return execute(sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    # connection_created receiver
+    if enabled() and not any(isinstance(wrapper, QueryTracer) for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.append(QueryTracer())
+
+
+class TraceContextFilter(logging.Filter):
+    """Add trace_id and span_id to log records ('-' outside traced requests)."""
+
+    def filter(self, record):
+        active = current_span.get()
+        record.trace_id = active.trace_id if active is not None else '-'
+        record.span_id = active.span_id if active is not None else '-'
+        return True
+
+
+# Export: spans are written by one background thread so requests only pay for a queue put
+
+_queue = queue.Queue(maxsize=10000)
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def export(span_dict):
+    global _worker
+    if getattr(settings, 'TRACE_EXPORTER', 'file') is None:
+        return
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = threading.Thread(target=_run, name='trace-export', daemon=True)
+                _worker.start()
+    try:
+        _queue.put_nowait(span_dict)
+    except queue.Full:
+        pass
+
+
+def trace_file(backup=0):
+    suffix = f'.{backup}' if backup else ''
+    return os.path.join(settings.TRACE_DIR, f'spans-{os.getpid()}{suffix}.jsonl')
+
+
+def _rotate():
+    # spans-<pid>.jsonl -> spans-<pid>.1.jsonl -> ... ; the oldest backup is dropped
+    backups = getattr(settings, 'TRACE_FILE_BACKUPS', 3)
+    if backups < 1:
+        os.remove(trace_file())
+        return
+    for backup in range(backups - 1, 0, -1):
+        if os.path.exists(trace_file(backup)):
+            os.replace(trace_file(backup), trace_file(backup + 1))
+    os.replace(trace_file(), trace_file(1))
+
+
+def _write(spans):
+    lines = ''.join(json.dumps(span, separators=(',', ':')) + '\n' for span in spans)
+    if getattr(settings, 'TRACE_EXPORTER', 'file') == 'console':
+        sys.stderr.write(lines)
+        return
+    os.makedirs(settings.TRACE_DIR, exist_ok=True)
+    try:
+        size = os.path.getsize(trace_file())
+    except OSError:
+        size = 0
+    if size and size + len(lines) > getattr(settings, 'TRACE_FILE_MAX_BYTES', 50 * 1024 * 1024):
+        _rotate()
+    with open(trace_file(), 'a', encoding='utf-8') as f:
+        f.write(lines)
+
+
+def _run():
+    while True:
+        batch = [_queue.get()]
+        while len(batch) < 500:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _write(batch)
+        except Exception:
+            logger.exception('Could not export %d span(s)', len(batch))
+        finally:
+            for _ in batch:
+                _queue.task_done()
+
+
+def flush(timeout=5):
+    """Wait for queued spans to be written (used by the traces command and tests)."""
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
@@ -5,8 +5,12 @@ from .views import (
     register_user, CustomAuthToken, user_profile, add_to_cart, get_cart_items, 
     create_order, get_user_orders, get_user_orders_with_items, update_cart_item, 
     delete_cart_item, get_order_details, get_all_orders_with_details,
-    submit_category_feedback, get_category_feedback, get_mango_category_feedbacks, get_all_feedbacks
+    submit_category_feedback, get_category_feedback, get_mango_category_feedbacks, get_all_feedbacks,
+    search_mangoes, get_sales_analytics, get_mango_recommendations, import_mango_stock, metrics,
+    get_profiles, get_profile, get_mango_availability, get_pending_feedback, submit_order_feedbacks,
+    search_orders, get_stock_levels
 )
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'mangoes', MangoCategoryViewSet)
@@ -30,6 +34,23 @@ urlpatterns = [
     path('admin-orders-details/', get_all_orders_with_details, name='get_all_orders_with_details'),
     path('order-item/<int:order_item_id>/feedback/', submit_category_feedback, name='submit_category_feedback'),
     path('order-item/<int:order_item_id>/get-feedback/', get_category_feedback, name='get_category_feedback'),
+    path('order/<int:order_id>/feedbacks/', submit_order_feedbacks, name='submit_order_feedbacks'),
+    path('pending-feedback/', get_pending_feedback, name='get_pending_feedback'),
     path('mango/<int:mango_id>/feedbacks/', get_mango_category_feedbacks, name='get_mango_category_feedbacks'),
+    path('mango/<int:mango_id>/recommendations/', get_mango_recommendations, name='get_mango_recommendations'),
+    path('mango/<int:mango_id>/availability/', get_mango_availability, name='get_mango_availability'),
+    path('stock-levels/', get_stock_levels, name='get_stock_levels'),
     path('admin/all-feedbacks/', get_all_feedbacks, name='get_all_feedbacks'),
+    path('admin/order-search/', search_orders, name='search_orders'),
+    path('admin/sales-analytics/', get_sales_analytics, name='get_sales_analytics'),
+    path('admin/mango-import/', import_mango_stock, name='import_mango_stock'),
+    path('metrics/', metrics, name='metrics'),
+    path('admin/profiles/', get_profiles, name='get_profiles'),
+    path('admin/profiles/<str:capture_id>/', get_profile, name='get_profile'),
+    path('mango-search/', search_mangoes, name='search_mangoes'),
+    # Async read endpoints (same responses as above; serve under ASGI)
+    path('async/mangoes/', async_views.list_mangoes, name='async_list_mangoes'),
+    path('async/mangoes/<int:mango_id>/', async_views.get_mango, name='async_get_mango'),
+    path('async/mango/<int:mango_id>/feedbacks/', async_views.get_mango_category_feedbacks, name='async_get_mango_category_feedbacks'),
+    path('async/user-orders-with-items/', async_views.get_user_orders_with_items, name='async_get_user_orders_with_items'),
 ]
@@ -1,20 +1,63 @@
+import json
+from datetime import timedelta
+from itertools import chain
+
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, Prefetch
+from django.http import FileResponse, HttpResponse
 from django.shortcuts import render
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.utils.dateparse import parse_date
+from django.utils.http import parse_etags
 from django.contrib.auth.models import User
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.authtoken.models import Token
 from rest_framework.views import APIView
 from rest_framework.authtoken.views import ObtainAuthToken
 
-from .models import MangoCategory, Cart, CartItem, Order, OrderItem, Payment, UserProfile, CategoryFeedback
-from .serializers import MangoCategorySerializer, CartItemSerializer, OrderSerializer, OrderWithItemsSerializer, PaymentSerializer, UserProfileSerializer, CategoryFeedbackSerializer
+from .models import MangoCategory, Cart, CartItem, Order, OrderItem, Payment, UserProfile, CategoryFeedback, MangoRecommendation, order_summary
+from .models import ArchivedOrder, ArchivedOrderItem
+from .search import search_mangoes as run_mango_search, order_search_filter
+from .bulk_import import BulkImportError, apply_import, parse_rows
+from .metrics import render_prometheus
+from .db_connections import record_pool_metrics
+from .auth_backends import email_taken
+from .password_pool import PasswordHashingBusy, hash_password
+from .response_cache import bump, cached_payload
+from .profiling import capture_path, list_captures
+from .tracing import span
+from .analytics import locked_status, record_order, record_status_change, sales_summary
+from . import reservations, stock_snapshot
+from .serializers import field_options, nested_options, wants
+from .serializers import MangoCategorySerializer, MangoSearchResultSerializer, CartItemSerializer, OrderSerializer, OrderWithItemsSerializer, PaymentSerializer, UserProfileSerializer, UserEmailSerializer, CategoryFeedbackSerializer, PendingFeedbackItemSerializer
 
 class MangoCategoryViewSet(viewsets.ModelViewSet):
     queryset = MangoCategory.objects.all()
     serializer_class = MangoCategorySerializer
 
+    @method_decorator(cached_payload('catalog'))
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_queryset(self):
+        queryset = MangoCategory.objects.all()
+        if self.action in ['list', 'retrieve']:
+            options = field_options(self.request)
+            # Ratings in the same query instead of two queries per mango
+            if wants(options, 'average_rating') or wants(options, 'total_ratings'):
+                queryset = queryset.annotate(rating_average=Avg('feedbacks__rating'), rating_count=Count('feedbacks'))
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in ['list', 'retrieve']:
+            kwargs.update(field_options(self.request))
+        return super().get_serializer(*args, **kwargs)
+
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             return [IsAdminUser()]
@@ -28,6 +71,31 @@ class CartItemViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return CartItem.objects.filter(cart__user=self.request.user)
 
+    # Keep the cart's last_activity current so it is not swept as abandoned,
+    # and the stock reservation in step with the quantity
+    def perform_create(self, serializer):
+        self._save_with_reservation(serializer).cart.touch()
+
+    def perform_update(self, serializer):
+        self._save_with_reservation(serializer).cart.touch()
+
+    def perform_destroy(self, instance):
+        cart = instance.cart
+        with transaction.atomic():
+            instance.delete()
+            reservations.release(self.request.user, [instance.mango_id])
+        cart.touch()
+
+    def _save_with_reservation(self, serializer):
+        with transaction.atomic():
+            cart_item = serializer.save()
+            if reservations.enabled():
+                try:
+                    reservations.reserve(self.request.user, cart_item.mango_id, cart_item.quantity)
+                except reservations.InsufficientStock as e:
+                    raise ValidationError({'error': str(e), 'available_quantity': e.available})
+        return cart_item
+
 class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
@@ -37,6 +105,13 @@ class OrderViewSet(viewsets.ModelViewSet):
             return [IsAdminUser()]
         return [IsAuthenticated()]
 
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            # Lock the row so a concurrent status change can't read the same previous status
+            previous_status = locked_status(serializer.instance.pk)
+            order = serializer.save()
+            record_status_change(order, previous_status)
+
 class PaymentViewSet(viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
@@ -46,6 +121,61 @@ class PaymentViewSet(viewsets.ModelViewSet):
             return [IsAdminUser()]
         return [IsAuthenticated()]
 
+# Full-text search over mango names and descriptions
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def search_mangoes(request):
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'error': 'Search query (q) is required'}, status=400)
+    try:
+        limit = int(request.query_params.get('limit', 20))
+    except ValueError:
+        return Response({'error': 'Invalid limit value'}, status=400)
+
+    results = run_mango_search(query, limit=limit)
+    serializer = MangoSearchResultSerializer(results, many=True, context={'request': request})
+    return Response({
+        'query': query,
+        'count': len(results),
+        'results': serializer.data
+    })
+
+# Only join / prefetch what the requested order fields need
+ORDER_ITEM_MANGO_FIELDS = ['mango_category', 'mango_name', 'mango_id', 'mango_image', 'description']
+
+def optimize_orders(orders, options, items_expandable=False):
+    if wants(options, 'user_name') or wants(options, 'user_email'):
+        orders = orders.select_related('user')
+    if wants(options, 'items', expandable=items_expandable):
+        item_options = nested_options(options, 'items')
+        items = (ArchivedOrderItem if orders.model is ArchivedOrder else OrderItem).objects.all()
+        if any(wants(item_options, name) for name in ORDER_ITEM_MANGO_FIELDS):
+            items = items.select_related('mango')
+        if wants(item_options, 'feedback'):
+            items = items.select_related('feedback__user', 'feedback__mango_category')
+        orders = orders.prefetch_related(Prefetch('orderitem_set', queryset=items))
+    return orders
+
+# Archived orders (see api/archive.py) are only read with ?include_archived=1
+def include_archived(request):
+    # DRF requests have query_params; plain Django requests (async views) only GET
+    return getattr(request, 'query_params', request.GET).get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+def page_params(request, default_size, max_size):
+    """(page, page_size) from the query string; raises ValueError when invalid."""
+    page = int(request.query_params.get('page', 1))
+    page_size = int(request.query_params.get('page_size', default_size))
+    if page < 1 or page_size < 1:
+        raise ValueError('page and page_size must be positive')
+    return page, min(page_size, max_size)
+
+def merge_orders(orders, archived):
+    return sorted(chain(orders, archived), key=lambda order: (order.order_date, order.id), reverse=True)
+
+def with_archived(orders, archived, options, items_expandable=False):
+    return merge_orders(orders, optimize_orders(archived, options, items_expandable=items_expandable))
+
 # User Registration API
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -57,7 +187,22 @@ def register_user(request):
         return Response({'error': 'Username and password required.'}, status=400)
     if User.objects.filter(username=username).exists():
         return Response({'error': 'Username already exists.'}, status=400)
-    user = User.objects.create_user(username=username, password=password, email=email)
+    if email and email_taken(email):
+        return Response({'error': 'Email already registered.'}, status=400)
+    try:
+        # Hash in the password pool rather than on this worker thread
+        encoded = hash_password(password)
+    except PasswordHashingBusy:
+        return Response({'error': 'Server busy, please try again.'}, status=503, headers={'Retry-After': '1'})
+    user = User(username=User.normalize_username(username), email=User.objects.normalize_email(email), password=encoded)
+    try:
+        with transaction.atomic():
+            user.save()
+    except IntegrityError:
+        # A concurrent sign-up took the username or email after the checks above
+        if User.objects.filter(username=user.username).exists():
+            return Response({'error': 'Username already exists.'}, status=400)
+        return Response({'error': 'Email already registered.'}, status=400)
     token, created = Token.objects.get_or_create(user=user)
     return Response({'token': token.key, 'username': user.username, 'email': user.email})
 
@@ -71,23 +216,20 @@ class CustomAuthToken(ObtainAuthToken):
         email = request.data.get('email')
         username = request.data.get('username')
         password = request.data.get('password')
-        user = None
-        if email:
-            try:
-                user_obj = User.objects.get(email=email)
-                username = user_obj.username
-                user = authenticate(request, username=username, password=password)
-            except User.DoesNotExist:
-                return Response({'error': 'Invalid email or password.'}, status=400)
-        elif username:
-            user = authenticate(request, username=username, password=password)
-        else:
+        if not email and not username:
             return Response({'error': 'Email or username required.'}, status=400)
-        if user is not None:
-            token, created = Token.objects.get_or_create(user=user)
-            return Response({'token': token.key, 'username': user.username, 'email': user.email})
-        else:
-            return Response({'error': 'Invalid credentials.'}, status=400)
+        # One indexed lookup (api.auth_backends.EmailOrUsernameBackend), token included
+        try:
+            user = authenticate(request, username=username, email=email, password=password)
+        except PasswordHashingBusy:
+            return Response({'error': 'Server busy, please try again.'}, status=503, headers={'Retry-After': '1'})
+        if user is None:
+            return Response({'error': 'Invalid email or password.' if email else 'Invalid credentials.'}, status=400)
+        try:
+            token = user.auth_token
+        except Token.DoesNotExist:
+            token = Token.objects.create(user=user)
+        return Response({'token': token.key, 'username': user.username, 'email': user.email})
 
 # User profile endpoint
 @api_view(['GET', 'PUT', 'PATCH'])
@@ -112,14 +254,29 @@ def user_profile(request):
         # Update user profile
         profile, created = UserProfile.objects.get_or_create(user=user)
         serializer = UserProfileSerializer(profile, data=request.data, partial=True)
-        
-        if serializer.is_valid():
-            serializer.save()
-            return Response({
-                'message': 'Profile updated successfully',
-                'profile': serializer.data
-            })
-        return Response(serializer.errors, status=400)
+        updates = [serializer]
+        # The email lives on the user and is only changed when sent
+        if 'email' in request.data:
+            updates.append(UserEmailSerializer(user, data={'email': request.data['email']}, partial=True))
+
+        errors = {}
+        for update in updates:
+            if not update.is_valid():
+                errors.update(update.errors)
+        if errors:
+            return Response(errors, status=400)
+        try:
+            with transaction.atomic():
+                for update in updates:
+                    update.save()
+        except IntegrityError:
+            # A concurrent sign-up or edit took the email after validation
+            return Response({'email': ['Email already registered.']}, status=400)
+        return Response({
+            'message': 'Profile updated successfully',
+            'email': user.email,
+            'profile': serializer.data
+        })
 
 # Add to cart endpoint
 @api_view(['POST'])
@@ -139,17 +296,27 @@ def add_to_cart(request):
     # Get or create cart for user
     cart, created = Cart.objects.get_or_create(user=request.user)
     
-    # Check if item already exists in cart
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart,
-        mango=mango,
-        defaults={'quantity': quantity}
-    )
-    
-    if not created:
-        # If item exists, update quantity
-        cart_item.quantity += int(quantity)
-        cart_item.save()
+    with transaction.atomic():
+        # Check if item already exists in cart
+        cart_item, created = CartItem.objects.get_or_create(
+            cart=cart,
+            mango=mango,
+            defaults={'quantity': quantity}
+        )
+        
+        if not created:
+            # If item exists, update quantity
+            cart_item.quantity += int(quantity)
+            cart_item.save()
+        
+        # Hold the stock for the whole cart quantity (flash sales)
+        if reservations.enabled():
+            try:
+                reservations.reserve(request.user, mango.id, int(cart_item.quantity))
+            except reservations.InsufficientStock as e:
+                transaction.set_rollback(True)
+                return Response({'error': str(e), 'available_quantity': e.available}, status=400)
+    cart.touch()
     
     return Response({
         'message': 'Item added to cart successfully',
@@ -157,14 +324,54 @@ def add_to_cart(request):
         'quantity': cart_item.quantity
     })
 
+# Stock availability for a mango category, net of live cart reservations
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_mango_availability(request, mango_id):
+    try:
+        mango = MangoCategory.objects.get(id=mango_id)
+    except MangoCategory.DoesNotExist:
+        return Response({'error': 'Mango not found'}, status=404)
+    return Response(reservations.availability(mango, request.user))
+
+# Live stock levels for inventory badges: ?ids=1,2,3 (default: every mango)
+# Served from the in-memory snapshot in api/stock_snapshot.py. Clients polling
+# with If-None-Match get a 304 until a level they asked for changes.
+STOCK_LEVELS_MAX_IDS = 200
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_stock_levels(request):
+    ids = request.query_params.get('ids')
+    try:
+        mango_ids = [int(part) for part in ids.split(',') if part.strip()] if ids else None
+    except ValueError:
+        return Response({'error': 'ids must be a comma separated list of mango ids'}, status=400)
+    if mango_ids is not None and len(mango_ids) > STOCK_LEVELS_MAX_IDS:
+        return Response({'error': f'At most {STOCK_LEVELS_MAX_IDS} ids per request'}, status=400)
+
+    version, levels = stock_snapshot.levels(mango_ids)
+    headers = {'ETag': f'"{version}"', 'Cache-Control': 'no-cache'}
+    # Weak comparison: CompressionMiddleware sends the ETag back as W/"..."
+    if_none_match = [tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))]
+    if headers['ETag'] in if_none_match or '*' in if_none_match:
+        return Response(status=304, headers=headers)
+    return Response({'version': version, 'levels': levels}, headers=headers)
+
 # Get cart items endpoint
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_cart_items(request):
     try:
         cart = Cart.objects.get(user=request.user)
-        cart_items = CartItem.objects.filter(cart=cart).select_related('mango')
-        serializer = CartItemSerializer(cart_items, many=True)
+        options = field_options(request)
+        cart_items = CartItem.objects.filter(cart=cart)
+        if wants(options, 'mango_category'):
+            cart_items = cart_items.select_related('mango')
+            mango_options = nested_options(options, 'mango_category')
+            if wants(mango_options, 'average_rating') or wants(mango_options, 'total_ratings'):
+                cart_items = cart_items.prefetch_related('mango__feedbacks')
+        serializer = CartItemSerializer(cart_items, many=True, **options)
         return Response(serializer.data)
     except Cart.DoesNotExist:
         return Response([])
@@ -174,44 +381,67 @@ def get_cart_items(request):
 @permission_classes([IsAuthenticated])
 def create_order(request):
     try:
-        cart = Cart.objects.get(user=request.user)
-        cart_items = CartItem.objects.filter(cart=cart)
-        
-        if not cart_items.exists():
-            return Response({'error': 'Cart is empty'}, status=400)
-        
-        # Calculate total amount
-        total_amount = sum(item.mango.price * item.quantity for item in cart_items)
-        
-        # Get order data from request
-        order_data = {
-            'user': request.user,
-            'total_amount': total_amount,
-            'phone_number': request.data.get('phone_number'),
-            'additional_phone': request.data.get('additional_phone', ''),
-            'billing_address': request.data.get('billing_address'),
-            'shipping_address': request.data.get('shipping_address'),
-            'payment_method': request.data.get('payment_method', 'cash_on_delivery'),
-        }
+        with span('checkout.load_cart'):
+            cart = Cart.objects.get(user=request.user)
+            cart_items = CartItem.objects.filter(cart=cart)
+            
+            if not cart_items.exists():
+                return Response({'error': 'Cart is empty'}, status=400)
+            
+            # Calculate total amount
+            total_amount = sum(item.mango.price * item.quantity for item in cart_items)
+            
+            # Get order data from request
+            order_data = {
+                'user': request.user,
+                'total_amount': total_amount,
+                'phone_number': request.data.get('phone_number'),
+                'additional_phone': request.data.get('additional_phone', ''),
+                'billing_address': request.data.get('billing_address'),
+                'shipping_address': request.data.get('shipping_address'),
+                'payment_method': request.data.get('payment_method', 'cash_on_delivery'),
+                # Item count, total kg and names for order lists
+                **order_summary((item.mango.name, item.quantity) for item in cart_items),
+            }
         
         # Validate required fields
         if not order_data['phone_number'] or not order_data['billing_address'] or not order_data['shipping_address']:
             return Response({'error': 'Phone number, billing address, and shipping address are required'}, status=400)
         
-        # Create order
-        order = Order.objects.create(**order_data)
-        
-        # Create order items
-        for cart_item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                mango=cart_item.mango,
-                quantity=cart_item.quantity,
-                price=cart_item.mango.price
-            )
-        
-        # Clear cart
-        cart_items.delete()
+        with transaction.atomic():
+            # Turn stock reservations into sold stock, re-checking availability
+            if reservations.enabled():
+                quantities = {}
+                for cart_item in cart_items:
+                    quantities[cart_item.mango_id] = quantities.get(cart_item.mango_id, 0) + cart_item.quantity
+                try:
+                    with span('checkout.consume_reservations'):
+                        reservations.consume(request.user, quantities)
+                except reservations.InsufficientStock as e:
+                    transaction.set_rollback(True)
+                    return Response({'error': str(e), 'available_quantity': e.available}, status=400)
+            
+            # Create order
+            with span('checkout.create_order'):
+                order = Order.objects.create(**order_data)
+            
+            # Create order items
+            with span('checkout.create_items'):
+                for cart_item in cart_items:
+                    OrderItem.objects.create(
+                        order=order,
+                        mango=cart_item.mango,
+                        quantity=cart_item.quantity,
+                        price=cart_item.mango.price
+                    )
+            
+            # Update sales rollups for admin analytics
+            with span('checkout.record_analytics'):
+                record_order(order)
+            
+            # Clear cart
+            with span('checkout.clear_cart'):
+                cart_items.delete()
         
         return Response({
             'message': 'Order created successfully',
@@ -228,16 +458,22 @@ def create_order(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_orders(request):
-    orders = Order.objects.filter(user=request.user).order_by('-order_date')
-    serializer = OrderSerializer(orders, many=True)
+    options = field_options(request)
+    orders = optimize_orders(Order.objects.filter(user=request.user).order_by('-order_date'), options, items_expandable=True)
+    if include_archived(request):
+        orders = with_archived(orders, ArchivedOrder.objects.filter(user=request.user), options, items_expandable=True)
+    serializer = OrderSerializer(orders, many=True, **options)
     return Response(serializer.data)
 
 # Get user orders with items endpoint
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_orders_with_items(request):
-    orders = Order.objects.filter(user=request.user).order_by('-order_date').select_related('user').prefetch_related('orderitem_set__mango')
-    serializer = OrderWithItemsSerializer(orders, many=True)
+    options = field_options(request)
+    orders = optimize_orders(Order.objects.filter(user=request.user).order_by('-order_date'), options)
+    if include_archived(request):
+        orders = with_archived(orders, ArchivedOrder.objects.filter(user=request.user), options)
+    serializer = OrderWithItemsSerializer(orders, many=True, **options)
     return Response(serializer.data)
 
 # Update cart item quantity endpoint
@@ -256,11 +492,20 @@ def update_cart_item(request, item_id):
         if quantity <= 0:
             return Response({'error': 'Quantity must be greater than 0'}, status=400)
         
-        if quantity > cart_item.mango.stock_quantity:
+        if not reservations.enabled() and quantity > cart_item.mango.stock_quantity:
             return Response({'error': f'Only {cart_item.mango.stock_quantity} kg available in stock'}, status=400)
         
-        cart_item.quantity = quantity
-        cart_item.save()
+        # The hold and the cart quantity change together or not at all
+        with transaction.atomic():
+            cart_item.quantity = quantity
+            cart_item.save()
+            if reservations.enabled():
+                try:
+                    reservations.reserve(request.user, cart_item.mango_id, quantity)
+                except reservations.InsufficientStock as e:
+                    transaction.set_rollback(True)
+                    return Response({'error': str(e), 'available_quantity': e.available}, status=400)
+        cart.touch()
         
         serializer = CartItemSerializer(cart_item)
         return Response({
@@ -282,7 +527,10 @@ def delete_cart_item(request, item_id):
     try:
         cart = Cart.objects.get(user=request.user)
         cart_item = CartItem.objects.get(id=item_id, cart=cart)
-        cart_item.delete()
+        with transaction.atomic():
+            cart_item.delete()
+            reservations.release(request.user, [cart_item.mango_id])
+        cart.touch()
         
         return Response({'message': 'Cart item deleted successfully'})
         
@@ -296,28 +544,150 @@ def delete_cart_item(request, item_id):
 @permission_classes([IsAuthenticated])
 def get_order_details(request, order_id):
     try:
-        # For regular users, only allow access to their own orders
+        options = field_options(request)
+        lookup = {'id': order_id}
+        # For regular users, only allow access to their own orders (admin can access any order)
         if not request.user.is_staff:
-            order = Order.objects.get(id=order_id, user=request.user)
-        else:
-            # Admin can access any order
-            order = Order.objects.get(id=order_id)
+            lookup['user'] = request.user
+        try:
+            order = optimize_orders(Order.objects.all(), options).get(**lookup)
+        except Order.DoesNotExist:
+            if not include_archived(request):
+                raise
+            order = optimize_orders(ArchivedOrder.objects.all(), options).get(**lookup)
         
-        serializer = OrderWithItemsSerializer(order)
+        serializer = OrderWithItemsSerializer(order, **options)
         return Response(serializer.data)
         
-    except Order.DoesNotExist:
+    except (Order.DoesNotExist, ArchivedOrder.DoesNotExist):
         return Response({'error': 'Order not found'}, status=404)
 
 # Get all orders (admin only) with detailed information
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def get_all_orders_with_details(request):
-    orders = Order.objects.all().order_by('-order_date').select_related('user').prefetch_related('orderitem_set__mango')
-    serializer = OrderWithItemsSerializer(orders, many=True)
+    options = field_options(request)
+    orders = optimize_orders(Order.objects.all().order_by('-order_date'), options)
+    if include_archived(request):
+        orders = with_archived(orders, ArchivedOrder.objects.all(), options)
+    serializer = OrderWithItemsSerializer(orders, many=True, **options)
     return Response(serializer.data)
 
 
+# Order search for support staff (admin only)
+# ?q= takes a phone number (any format), part of the shipping address, a
+# customer email or #<order id>; see order_search_filter in api/search.py.
+# Paged like the pending-feedback inbox; ?include_archived=1 also searches the archive.
+ORDER_SEARCH_PAGE_SIZE = 20
+ORDER_SEARCH_MAX_PAGE_SIZE = 100
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def search_orders(request):
+    query = request.query_params.get('q', '').strip()
+    condition = order_search_filter(query)
+    if condition is None:
+        return Response({'error': 'Search query (q) must have at least 3 characters or digits'}, status=400)
+    try:
+        page, page_size = page_params(request, ORDER_SEARCH_PAGE_SIZE, ORDER_SEARCH_MAX_PAGE_SIZE)
+    except ValueError:
+        return Response({'error': 'Invalid page or page_size value'}, status=400)
+
+    options = field_options(request)
+    offset = (page - 1) * page_size
+    end = offset + page_size + 1
+    orders = list(optimize_orders(Order.objects.filter(condition), options).order_by('-order_date', '-id')[:end])
+    if include_archived(request):
+        archived = optimize_orders(ArchivedOrder.objects.filter(condition), options).order_by('-order_date', '-id')
+        orders = merge_orders(orders, archived[:end])
+    orders = orders[offset:end]
+    serializer = OrderSerializer(orders[:page_size], many=True, **options)
+    return Response({
+        'query': query,
+        'results': serializer.data,
+        'page': page,
+        'page_size': page_size,
+        'has_next': len(orders) > page_size
+    })
+
+
+# Sales analytics from the pre-aggregated rollup tables (admin only)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_sales_analytics(request):
+    today = timezone.localdate()
+    start = request.query_params.get('start')
+    end = request.query_params.get('end')
+    try:
+        start = parse_date(start) if start else today - timedelta(days=29)
+        end = parse_date(end) if end else today
+        top = int(request.query_params.get('top', 10))
+    except ValueError:
+        return Response({'error': 'Invalid start, end or top value'}, status=400)
+    if start is None or end is None:
+        return Response({'error': 'Dates must be in YYYY-MM-DD format'}, status=400)
+    if start > end:
+        return Response({'error': 'Start date must not be after end date'}, status=400)
+
+    return Response(sales_summary(start, end, top=max(1, min(top, 100))))
+
+
+# Bulk stock / price import for mango categories (admin only)
+# Accepts an uploaded CSV/JSON `file` or a JSON body with `rows`; add ?dry_run=1 to preview
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def import_mango_stock(request):
+    dry_run = request.query_params.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    try:
+        upload = request.FILES.get('file')
+        if upload:
+            rows = parse_rows(upload.read(), fmt=request.data.get('format'), filename=upload.name)
+        else:
+            # JSON body: {"rows": [...]} or the list of rows itself
+            data = request.data
+            rows = data.get('rows') if isinstance(data, dict) else data
+            if not isinstance(rows, list):
+                return Response({'error': 'Upload a file or send a list of rows'}, status=400)
+        result = apply_import(rows, dry_run=dry_run)
+    except BulkImportError as e:
+        return Response({'error': 'Import rejected', 'details': e.errors}, status=400)
+
+    return Response(result)
+
+
+# Request metrics in the Prometheus text format (staff only)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    record_pool_metrics()
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# Recent request profiles (staff only)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_profiles(request):
+    return Response(list_captures())
+
+
+# Profile details, or the raw .prof / .folded file with ?download=1
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_profile(request, capture_id):
+    meta_path = capture_path(capture_id, 'json')
+    if meta_path is None:
+        return Response({'error': 'Profile not found'}, status=404)
+    with open(meta_path) as f:
+        meta = json.load(f)
+
+    if request.query_params.get('download'):
+        path = capture_path(capture_id, meta['file'].rsplit('.', 1)[-1])
+        if path is None:
+            return Response({'error': 'Profile file missing'}, status=404)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=meta['file'])
+    return Response(meta)
+
+
 # Submit or update feedback for a specific order item (mango category in an order)
 @api_view(['POST', 'PUT'])
 @permission_classes([IsAuthenticated])
@@ -402,14 +772,118 @@ def get_category_feedback(request, order_item_id):
         return Response({'error': 'Order item not found'}, status=404)
 
 
+# Delivered order items the user has not reviewed yet, newest first.
+# One LEFT JOIN ... WHERE feedback.id IS NULL query per page; one extra row
+# is fetched to tell whether there is a next page instead of counting.
+PENDING_FEEDBACK_PAGE_SIZE = 20
+PENDING_FEEDBACK_MAX_PAGE_SIZE = 100
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_pending_feedback(request):
+    try:
+        page, page_size = page_params(request, PENDING_FEEDBACK_PAGE_SIZE, PENDING_FEEDBACK_MAX_PAGE_SIZE)
+    except ValueError:
+        return Response({'error': 'Invalid page or page_size value'}, status=400)
+
+    offset = (page - 1) * page_size
+    items = list(
+        OrderItem.objects.filter(order__user=request.user, order__status__iexact='delivered', feedback__isnull=True)
+        .select_related('order', 'mango')
+        .only('id', 'order_id', 'mango_id', 'quantity', 'order__order_date', 'mango__name', 'mango__image')
+        .order_by('-order__order_date', 'id')[offset:offset + page_size + 1]
+    )
+    serializer = PendingFeedbackItemSerializer(items[:page_size], many=True, context={'request': request})
+    return Response({
+        'results': serializer.data,
+        'page': page,
+        'page_size': page_size,
+        'has_next': len(items) > page_size
+    })
+
+
+# Submit or update ratings for several items of one delivered order at once:
+# {"feedbacks": [{"order_item_id": 1, "rating": 5, "comment": "..."}, ...]}
+# All entries are validated first, then written with one upsert.
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def submit_order_feedbacks(request, order_id):
+    try:
+        order = Order.objects.only('id', 'user_id', 'status').get(id=order_id)
+    except Order.DoesNotExist:
+        return Response({'error': 'Order not found'}, status=404)
+    if order.user_id != request.user.id:
+        return Response({'error': 'You do not have permission to give feedback for this order'}, status=403)
+    if order.status.lower() != 'delivered':
+        return Response({'error': 'Feedback can only be submitted for delivered orders'}, status=400)
+
+    entries = request.data.get('feedbacks')
+    if not isinstance(entries, list) or not entries:
+        return Response({'error': 'feedbacks must be a non-empty list'}, status=400)
+
+    ratings = {}
+    for entry in entries:
+        try:
+            order_item_id = int(entry['order_item_id'])
+            rating = int(entry['rating'])
+        except (KeyError, TypeError, ValueError):
+            return Response({'error': 'Each feedback needs an order_item_id and a numeric rating'}, status=400)
+        if not 1 <= rating <= 5:
+            return Response({'error': 'Rating must be between 1 and 5', 'order_item_id': order_item_id}, status=400)
+        if order_item_id in ratings:
+            return Response({'error': 'Duplicate order_item_id', 'order_item_id': order_item_id}, status=400)
+        ratings[order_item_id] = (rating, entry.get('comment') or '')
+
+    # Item -> (mango, existing feedback) in one query
+    items = {
+        item_id: (mango_id, feedback_id)
+        for item_id, mango_id, feedback_id in OrderItem.objects.filter(order=order, id__in=ratings)
+        .values_list('id', 'mango_id', 'feedback__id')
+    }
+    missing = sorted(set(ratings) - set(items))
+    if missing:
+        return Response({'error': 'Order items not found in this order', 'order_item_ids': missing}, status=400)
+
+    with transaction.atomic():
+        # bulk_create skips post_save, so invalidate the cached rating payloads here
+        CategoryFeedback.objects.bulk_create(
+            [
+                CategoryFeedback(order_item_id=item_id, user=request.user, mango_category_id=items[item_id][0],
+                                 rating=rating, comment=comment)
+                for item_id, (rating, comment) in ratings.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['order_item'],
+            update_fields=['rating', 'comment', 'updated_at'],
+        )
+        transaction.on_commit(lambda: bump('catalog', 'feedback'))
+
+    feedbacks = (CategoryFeedback.objects.filter(order_item_id__in=ratings)
+                 .select_related('user', 'mango_category').order_by('order_item_id'))
+    serializer = CategoryFeedbackSerializer(feedbacks, many=True)
+    created = sum(1 for _, feedback_id in items.values() if feedback_id is None)
+    return Response({
+        'message': 'Feedback saved successfully',
+        'created': created,
+        'updated': len(items) - created,
+        'feedbacks': serializer.data
+    })
+
+
 # Get all feedbacks for a specific mango category (for display on category page)
+@cached_payload('feedback')
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_mango_category_feedbacks(request, mango_id):
     try:
         mango = MangoCategory.objects.get(id=mango_id)
-        feedbacks = CategoryFeedback.objects.filter(mango_category=mango).select_related('user').order_by('-created_at')
-        serializer = CategoryFeedbackSerializer(feedbacks, many=True)
+        options = field_options(request)
+        feedbacks = CategoryFeedback.objects.filter(mango_category=mango).order_by('-created_at')
+        if wants(options, 'user_name'):
+            feedbacks = feedbacks.select_related('user')
+        if wants(options, 'mango_name'):
+            feedbacks = feedbacks.select_related('mango_category')
+        serializer = CategoryFeedbackSerializer(feedbacks, many=True, **options)
         
         # Calculate statistics
         if feedbacks:
@@ -428,11 +902,33 @@ def get_mango_category_feedbacks(request, mango_id):
         return Response({'error': 'Mango category not found'}, status=404)
 
 
+# "Customers who bought this also bought" for a mango category page
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_mango_recommendations(request, mango_id):
+    try:
+        recommendation = MangoRecommendation.objects.only('neighbours', 'updated_at').get(mango_id=mango_id)
+    except MangoRecommendation.DoesNotExist:
+        # Not built yet (or a brand new mango): nothing to recommend
+        return Response({'mango_id': mango_id, 'recommendations': []})
+
+    return Response({
+        'mango_id': mango_id,
+        'recommendations': recommendation.neighbours,
+        'updated_at': recommendation.updated_at
+    })
+
+
 # Get all feedbacks (admin only)
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def get_all_feedbacks(request):
-    feedbacks = CategoryFeedback.objects.all().select_related('user', 'mango_category', 'order_item__order').order_by('-created_at')
-    serializer = CategoryFeedbackSerializer(feedbacks, many=True)
+    options = field_options(request)
+    feedbacks = CategoryFeedback.objects.all().order_by('-created_at')
+    if wants(options, 'user_name'):
+        feedbacks = feedbacks.select_related('user')
+    if wants(options, 'mango_name'):
+        feedbacks = feedbacks.select_related('mango_category')
+    serializer = CategoryFeedbackSerializer(feedbacks, many=True, **options)
     return Response(serializer.data)
 
@@ -14,3 +14,19 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+# Serving under ASGI
+# The read-heavy endpoints have async variants under /api/async/ (see
+# api/async_views.py) and all project middleware runs natively in async mode,
+# so a slow client or query only parks a coroutine instead of a worker thread.
+# A production-style setup with uvicorn (pip install "uvicorn[standard]"):
+#
+#   uvicorn core.asgi:application --host 0.0.0.0 --port 8001 \
+#       --workers 4 --backlog 2048 --timeout-keep-alive 5 --limit-concurrency 1000
+#
+# or behind gunicorn: gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker -w 4
+#
+# Each worker runs sync code (DRF views, ORM calls made from async views) in
+# a thread pool, so keep CONN_MAX_AGE at 0 under ASGI and cap database
+# connections with a pool or PgBouncer. `manage.py benchmark_asgi` compares
+# this setup with the WSGI server.
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,12 +46,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.TracingMiddleware',
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ProfilerMiddleware',
+    'api.middleware.SlowQueryMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -105,6 +111,64 @@ DATABASES = {
     }
 }
 
+# Database connections
+# WSGI (default): each worker thread keeps its connection for DB_CONN_MAX_AGE
+# seconds and checks it is still alive before reusing it after a request.
+# DB_POOL=1: psycopg 3 connection pool shared by the threads of a process
+# (Django 5.1+, `pip install "psycopg[binary,pool]"`). Use it under ASGI,
+# where per-thread persistent connections are not reused between requests.
+# `manage.py check_db_connections` verifies the configured behaviour.
+
+DB_POOL = os.environ.get('DB_POOL', '') == '1'
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 2))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+# Seconds a request waits for a free pooled connection before failing
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+DB_POOL_MAX_IDLE = 300
+DB_POOL_MAX_LIFETIME = 1800
+
+# Health checks test a reused connection (or, with the pool, each connection
+# handed out) before a request uses it
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+if DB_POOL:
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+            'max_idle': DB_POOL_MAX_IDLE,
+            'max_lifetime': DB_POOL_MAX_LIFETIME,
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+
+
+# Authentication
+# Username or case-insensitive email login with a single indexed query
+
+AUTHENTICATION_BACKENDS = ['api.auth_backends.EmailOrUsernameBackend']
+
+
+# Password hashing (see api/password_pool.py)
+# Hashes run in a pool of PASSWORD_HASH_WORKERS processes (0 = on the request
+# thread). Requests wait up to PASSWORD_HASH_WAIT seconds for one of the
+# PASSWORD_HASH_MAX_PENDING slots before getting a 503.
+# Every web worker process starts its own pool, so the host runs
+# (web workers x PASSWORD_HASH_WORKERS) hashing processes; keep that at or
+# below the number of cores. By default the cores are split between the
+# WEB_CONCURRENCY web workers (the worker count gunicorn / uvicorn read from
+# the environment), and each process gets a single hashing worker otherwise.
+
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 0))
+PASSWORD_HASH_WORKERS = int(os.environ.get(
+    'PASSWORD_HASH_WORKERS',
+    max((os.cpu_count() or 1) // WEB_CONCURRENCY, 1) if WEB_CONCURRENCY else 1,
+))
+PASSWORD_HASH_MAX_PENDING = PASSWORD_HASH_WORKERS * 4
+PASSWORD_HASH_WAIT = 2.0
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -148,6 +212,121 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+MEDIA_SERVE = True  # serve MEDIA_URL through api.media.serve_media
+MEDIA_CACHE_MAX_AGE = 3600  # seconds, for files without a content hash in the name
+MEDIA_IMMUTABLE_PATTERN = r'\.[0-9a-f]{8,}\.\w+$'  # e.g. langra.3f9c2ab1.jpg, cached for a year
+# None (Python streams the file), 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache / lighttpd).
+# For nginx, map MEDIA_OFFLOAD_PREFIX to MEDIA_ROOT in an `internal` location.
+MEDIA_OFFLOAD = None
+MEDIA_OFFLOAD_PREFIX = '/protected-media/'
+
+# Abandoned carts
+# Carts with no activity for this many days are removed by `manage.py cleanup_carts`
+
+CART_EXPIRY_DAYS = 30
+
+# Order archive
+# Orders in these statuses placed more than ORDER_ARCHIVE_AFTER_DAYS ago are
+# moved to the archive tables by `manage.py archive_orders` (run it nightly).
+# Order endpoints only return archived orders with ?include_archived=1.
+
+ORDER_ARCHIVE_AFTER_DAYS = 365
+ORDER_ARCHIVE_STATUSES = ['Delivered', 'Cancelled']
+
+# Django admin
+# Unfiltered changelists of tables above this many rows show PostgreSQL's
+# row estimate instead of running an exact COUNT(*)
+
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
+# Stock reservations (flash sales)
+# When enabled, cart quantities hold stock for STOCK_RESERVATION_MINUTES and
+# checkout decrements stock_quantity. Run `manage.py release_reservations`
+# every few minutes to delete expired holds (they stop counting immediately).
+
+STOCK_RESERVATIONS_ENABLED = os.environ.get('STOCK_RESERVATIONS_ENABLED', '') == '1'
+STOCK_RESERVATION_MINUTES = 15
+
+# Stock levels endpoint (/api/stock-levels/)
+# Each worker serves levels from an in-memory snapshot rebuilt at most this
+# often; changes made through the same worker show up immediately.
+
+STOCK_SNAPSHOT_MAX_AGE = 2.0  # seconds
+
+# Request metrics (exposed to staff at /api/metrics/)
+# With several worker processes, point METRICS_DIR at a directory shared by
+# all workers (cleared on deploy) so the endpoint can add their counts up.
+# Files of workers that have exited are folded into metrics-dead.json when the
+# endpoint is scraped; with gunicorn, also call
+# api.metrics.mark_process_dead(worker.pid) from the child_exit hook.
+
+METRICS_ENABLED = True
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 5  # seconds between per-worker snapshots
+
+# Per-request profiling (staff add ?profile=1 or ?profile=sample to a request)
+# Captures are listed at /api/admin/profiles/
+
+PROFILE_DIR = BASE_DIR / 'profiles'
+PROFILE_KEEP = 50  # most recent captures kept on disk
+PROFILE_SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+PROFILE_TOKEN_MAX_AGE = 3600  # lifetime of X-Profile-Token values, in seconds
+
+# Slow-query log (see `manage.py slow_queries`); set SLOW_QUERY_MS to None to disable
+
+SLOW_QUERY_MS = 200
+SLOW_QUERY_EXPLAIN = True  # capture EXPLAIN plans for slow SELECTs in the background
+SLOW_QUERY_EXPLAIN_INTERVAL = 3600  # seconds before the same statement is explained again
+
+# Request tracing (see api/tracing.py and `manage.py traces`)
+# Every request gets a trace id (X-Trace-Id, log records); TRACE_SAMPLE_RATE of
+# them record spans. With TRACE_HONOR_PARENT, requests whose W3C traceparent
+# header says "sampled" are recorded too; only turn it on behind a proxy or
+# gateway that sets or strips that header, or any client can force recording.
+
+TRACING_ENABLED = True
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '0'))
+TRACE_HONOR_PARENT = os.environ.get('TRACE_HONOR_PARENT', '') == '1'
+TRACE_EXPORTER = os.environ.get('TRACE_EXPORTER', 'file')  # 'file', 'console' or None
+TRACE_DIR = BASE_DIR / 'traces'
+TRACE_FILE_MAX_BYTES = 50 * 1024 * 1024  # per span file before it is rotated
+TRACE_FILE_BACKUPS = 3  # rotated files kept per process
+
+# Logging: api.* records carry the request's trace id
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'trace_context': {'()': 'api.tracing.TraceContextFilter'},
+    },
+    'formatters': {
+        'traced': {'format': '%(asctime)s %(levelname)s %(name)s [trace=%(trace_id)s span=%(span_id)s] %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'filters': ['trace_context'], 'formatter': 'traced'},
+    },
+    'loggers': {
+        'api': {'handlers': ['console'], 'level': os.environ.get('API_LOG_LEVEL', 'WARNING')},
+    },
+}
+
+# Caching
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Use a shared cache (Redis / Memcached) when running several workers so that
+# cached catalog payloads are invalidated everywhere at once.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+PAYLOAD_CACHE_TIMEOUT = 300  # seconds a cached catalog / review payload is kept
+
+# Response compression (api.middleware.CompressionMiddleware); brotli is used if installed
+
+COMPRESSION_MIN_SIZE = 1024  # bytes; smaller responses are sent as-is
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 